@@ -58,6 +58,10 @@ class Settings(BaseSettings):
     finviz_rate_window: int = Field(default=60, description="Window in seconds")
     model_rate_limit: int = Field(default=100, description="Model calls per window")
     model_rate_window: int = Field(default=60, description="Window in seconds")
+    model_token_rate_limit: int = Field(
+        default=0,
+        description="Estimated prompt tokens per model per window (0 disables)"
+    )
     
     # Cache Configuration
     headline_cache_ttl: int = Field(default=300, description="Headlines cache TTL")
@@ -333,6 +337,14 @@ class Settings(BaseSettings):
         default=24,
         description="Maximum age of headlines to process"
     )
+    quorum_enabled: bool = Field(
+        default=False,
+        description="Stop waiting on slower models once the majority vote is locked in"
+    )
+    quorum_min_confidence: float = Field(
+        default=0.7,
+        description="Average confidence the agreeing models need before early exit"
+    )
     
     @validator("finviz_portfolio_numbers", pre=True)
     def parse_portfolio_numbers(cls, v):
@@ -19,6 +19,8 @@ from routers import (
 )
 from services.cache import CacheManager
 from services.scheduler import TaskScheduler
+from services.model_fetcher import model_fetcher
+from services.sentiment_analyzer import close_shared_clients
 
 # Configure structured logging
 structlog.configure(
@@ -96,6 +98,9 @@ async def lifespan(app: FastAPI):
         # Initialize cache manager
         cache_manager = CacheManager(redis_client)
         
+        # Share model lists across workers and restarts
+        model_fetcher.redis = redis_client
+        
         # Initialize task scheduler
         task_scheduler = TaskScheduler(redis_client)
         await task_scheduler.start()
@@ -118,6 +123,9 @@ async def lifespan(app: FastAPI):
         if task_scheduler:
             await task_scheduler.stop()
         
+        await model_fetcher.aclose()
+        await close_shared_clients()
+        
         if redis_client:
             await redis_client.close()
         
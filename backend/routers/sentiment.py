@@ -5,6 +5,7 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
+from sqlalchemy.exc import IntegrityError
 import structlog
 import numpy as np
 
@@ -94,6 +95,65 @@ async def analyze_headline_sentiment(
     }
 
 
+def _headline_payload(headline: Headline) -> dict:
+    """Build the analyzer input for a headline row"""
+    return {
+        "id": headline.id,
+        "ticker": headline.ticker,
+        "company": headline.company,
+        "headline": headline.headline,
+        "source": headline.source,
+        "link": headline.link,
+        "headline_timestamp": headline.headline_timestamp.isoformat(),
+        "first_seen_timestamp": headline.first_seen_timestamp.isoformat(),
+        "market_session": headline.market_session,
+        "headline_age_minutes": headline.headline_age_minutes,
+        "sector": headline.sector,
+        "industry": headline.industry,
+        "is_primary_source": headline.is_primary_source
+    }
+
+
+async def _persist_analysis(session: AsyncSession, headline: Headline, result: dict) -> bool:
+    """Stage model results and the aggregate for a headline; False if already analyzed"""
+    # Check if already analyzed (race condition protection)
+    existing_aggregate = await session.execute(
+        select(SentimentAggregate).where(SentimentAggregate.headline_id == headline.id)
+    )
+    if existing_aggregate.scalar_one_or_none():
+        logger.info("sentiment_analysis_skipped", headline_id=str(headline.id), reason="already_analyzed")
+        return False
+
+    # Store individual model results
+    for model_result in result["model_results"]:
+        sentiment_analysis = SentimentAnalysis(
+            headline_id=headline.id,
+            model_provider=model_result["model_provider"],
+            model_name=model_result["model_name"],
+            sentiment=model_result["sentiment"],
+            confidence=model_result["confidence"],
+            rationale=model_result["rationale"],
+            horizon=model_result["horizon"],
+            response_time_ms=model_result["response_time_ms"]
+        )
+        session.add(sentiment_analysis)
+
+    # Store aggregate
+    aggregated = result["aggregated"]
+    sentiment_aggregate = SentimentAggregate(
+        headline_id=headline.id,
+        avg_sentiment=aggregated["avg_sentiment"],
+        avg_confidence=aggregated["avg_confidence"],
+        dispersion=aggregated["dispersion"],
+        majority_vote=aggregated["majority_vote"],
+        horizon_vote=aggregated.get("horizon_vote"),
+        num_models=aggregated["num_models"],
+        model_votes=aggregated["model_votes"]
+    )
+    session.add(sentiment_aggregate)
+    return True
+
+
 async def analyze_headline_task(
     headline: Headline,
     models: List[str],
@@ -104,21 +164,7 @@ async def analyze_headline_task(
     """
     try:
         # Prepare headline data
-        headline_data = {
-            "id": headline.id,
-            "ticker": headline.ticker,
-            "company": headline.company,
-            "headline": headline.headline,
-            "source": headline.source,
-            "link": headline.link,
-            "headline_timestamp": headline.headline_timestamp.isoformat(),
-            "first_seen_timestamp": headline.first_seen_timestamp.isoformat(),
-            "market_session": headline.market_session,
-            "headline_age_minutes": headline.headline_age_minutes,
-            "sector": headline.sector,
-            "industry": headline.industry,
-            "is_primary_source": headline.is_primary_source
-        }
+        headline_data = _headline_payload(headline)
 
         # Run sentiment analysis
         async with SentimentAnalyzer() as analyzer:
@@ -126,49 +172,15 @@ async def analyze_headline_task(
 
         # Persist results using a fresh session (request-scoped session may be closed)
         async with AsyncSessionLocal() as session:
-            # Check if already analyzed (race condition protection)
-            existing_aggregate = await session.execute(
-                select(SentimentAggregate).where(SentimentAggregate.headline_id == headline.id)
-            )
-            if existing_aggregate.scalar_one_or_none():
-                logger.info("sentiment_analysis_skipped", headline_id=str(headline.id), reason="already_analyzed")
+            if not await _persist_analysis(session, headline, result):
                 return
-
-            # Store individual model results
-            for model_result in result["model_results"]:
-                sentiment_analysis = SentimentAnalysis(
-                    headline_id=headline.id,
-                    model_provider=model_result["model_provider"],
-                    model_name=model_result["model_name"],
-                    sentiment=model_result["sentiment"],
-                    confidence=model_result["confidence"],
-                    rationale=model_result["rationale"],
-                    horizon=model_result["horizon"],
-                    response_time_ms=model_result["response_time_ms"]
-                )
-                session.add(sentiment_analysis)
-
-            # Store aggregate
-            aggregated = result["aggregated"]
-            sentiment_aggregate = SentimentAggregate(
-                headline_id=headline.id,
-                avg_sentiment=aggregated["avg_sentiment"],
-                avg_confidence=aggregated["avg_confidence"],
-                dispersion=aggregated["dispersion"],
-                majority_vote=aggregated["majority_vote"],
-                horizon_vote=aggregated.get("horizon_vote"),
-                num_models=aggregated["num_models"],
-                model_votes=aggregated["model_votes"]
-            )
-            session.add(sentiment_aggregate)
-
             await session.commit()
 
         logger.info(
             "sentiment_analysis_complete",
             headline_id=str(headline.id),
             models_used=len(result["model_results"]),
-            avg_sentiment=aggregated["avg_sentiment"]
+            avg_sentiment=result["aggregated"]["avg_sentiment"]
         )
 
     except Exception as e:
@@ -180,6 +192,61 @@ async def analyze_headline_task(
         )
 
 
+async def analyze_headlines_batch_task(
+    headlines: List[Headline],
+    models: List[str]
+):
+    """Background task to analyze many headlines with row-packed model requests.
+    Headlines no model could score are left unanalyzed for a later run.
+    """
+    try:
+        async with SentimentAnalyzer() as analyzer:
+            results = await analyzer.analyze_headlines_batch(
+                [_headline_payload(h) for h in headlines], models
+            )
+
+        stored = 0
+        async with AsyncSessionLocal() as session:
+            for headline, result in zip(headlines, results):
+                if result["aggregated"] is None:
+                    logger.warning(
+                        "sentiment_analysis_failed",
+                        headline_id=str(headline.id),
+                        errors=result["errors"]
+                    )
+                    continue
+                # A savepoint per headline keeps one conflicting row (e.g. a
+                # concurrent /analyze/{id}) from discarding the whole batch
+                try:
+                    async with session.begin_nested():
+                        persisted = await _persist_analysis(session, headline, result)
+                except IntegrityError as e:
+                    logger.warning(
+                        "sentiment_analysis_skipped",
+                        headline_id=str(headline.id),
+                        reason="conflict",
+                        error=str(e)
+                    )
+                    continue
+                if persisted:
+                    stored += 1
+            await session.commit()
+
+        logger.info(
+            "sentiment_batch_analysis_complete",
+            headlines=len(headlines),
+            stored=stored
+        )
+
+    except Exception as e:
+        logger.error(
+            "sentiment_batch_analysis_error",
+            headlines=len(headlines),
+            error=str(e),
+            exc_info=True
+        )
+
+
 async def generate_opportunities_after_analysis(headline_count: int):
     """Background task to generate opportunities after sentiment analysis completes"""
     try:
@@ -266,14 +333,12 @@ async def analyze_batch_sentiments(
     if not models:
         raise HTTPException(400, "No models selected for analysis")
     
-    # Start background analysis for each headline
-    for headline in headlines:
-        background_tasks.add_task(
-            analyze_headline_task,
-            headline,
-            models,
-            db
-        )
+    # Start background analysis; headlines are packed several per model request
+    background_tasks.add_task(
+        analyze_headlines_batch_task,
+        headlines,
+        models
+    )
     
     # Schedule opportunity generation after analysis completes
     if auto_generate_opportunities and len(headlines) > 0:
@@ -343,8 +408,7 @@ async def analyze_recent(
     if not models:
         raise HTTPException(400, "No models selected for analysis")
 
-    for headline in headlines:
-        background_tasks.add_task(analyze_headline_task, headline, models, db)
+    background_tasks.add_task(analyze_headlines_batch_task, headlines, models)
 
     # Schedule opportunity generation after analysis completes
     if auto_generate_opportunities and len(headlines) > 0:
@@ -370,8 +434,6 @@ async def schedule_periodic_analysis(request: Request, interval_seconds: int = 3
         raise HTTPException(503, "Scheduler not available")
 
     # Add or replace a periodic sentiment task
-    import asyncio
-
     async def periodic_task():
         from database import AsyncSessionLocal
         async with AsyncSessionLocal() as s:
@@ -381,17 +443,8 @@ async def schedule_periodic_analysis(request: Request, interval_seconds: int = 3
             except Exception:
                 pass
 
-    # Cancel existing if any
-    if "sentiment_recent" in task_scheduler.tasks:
-        task_scheduler.tasks["sentiment_recent"].cancel()
-        try:
-            await task_scheduler.tasks["sentiment_recent"]
-        except Exception:
-            pass
-
-    task_scheduler.tasks["sentiment_recent"] = asyncio.create_task(
-        task_scheduler._run_periodically(periodic_task, max(60, interval_seconds))
-    )
+    # Replaces (and cancels) any existing job with the same name
+    task_scheduler.schedule("sentiment_recent", periodic_task, max(60, interval_seconds))
 
     return {"status": "scheduled", "interval_seconds": max(60, interval_seconds)}
 
@@ -139,6 +139,10 @@ async def update_settings(
     
     await db.commit()
     
+    # Stored keys may have changed; drop the fetcher's cached copy
+    if changed_key:
+        model_fetcher.invalidate_keys()
+    
     # Update app settings if needed
     if settings.finviz_api_key:
         app_settings.finviz_api_key = settings.finviz_api_key
@@ -352,7 +356,7 @@ async def refresh_models():
     """Force refresh of model lists from provider APIs"""
     try:
         # Clear cache to force fresh fetch
-        model_fetcher.clear_cache()
+        await model_fetcher.clear_cache()
         
         # Fetch fresh models
         all_models = await model_fetcher.refresh_all_models()
@@ -1,14 +1,20 @@
 """Cache management service"""
 
+import contextlib
+import importlib
 import json
 import hashlib
-from typing import Any, Optional
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 from datetime import timedelta
 import redis.asyncio as redis
 import structlog
 
 logger = structlog.get_logger()
 
+# Keys per UNLINK command when flushing large keyspaces
+UNLINK_BATCH_SIZE = 500
+
 
 class CacheManager:
     """Manage Redis cache operations"""
@@ -47,6 +53,19 @@ class CacheManager:
             logger.error("cache_get_error", key=key, error=str(e))
             return None
     
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values in one round-trip (None for each miss)"""
+        if not self.redis or not keys:
+            return [None] * len(keys)
+        
+        try:
+            values = await self.redis.mget(keys)
+            return [json.loads(value) if value else None for value in values]
+        
+        except Exception as e:
+            logger.error("cache_get_many_error", keys=len(keys), error=str(e))
+            return [None] * len(keys)
+    
     async def set(
         self,
         key: str,
@@ -103,6 +122,47 @@ class CacheManager:
             logger.error("cache_delete_pattern_error", pattern=pattern, error=str(e))
             return 0
     
+    async def unlink(self, *keys: str) -> int:
+        """Delete keys without blocking Redis on reclamation"""
+        if not self.redis or not keys:
+            return 0
+
+        try:
+            return await self.redis.unlink(*keys)
+        
+        except Exception as e:
+            logger.error("cache_unlink_error", keys=len(keys), error=str(e))
+            return 0
+    
+    async def unlink_many(
+        self,
+        patterns: Iterable[str] = (),
+        keys: Iterable[str] = ()
+    ) -> int:
+        """Unlink pattern matches and explicit keys in one pipelined round-trip"""
+        if not self.redis:
+            return 0
+
+        try:
+            targets = list(keys)
+            for pattern in patterns:
+                async for key in self.redis.scan_iter(match=pattern):
+                    targets.append(key)
+            
+            if not targets:
+                return 0
+            
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for start in range(0, len(targets), UNLINK_BATCH_SIZE):
+                    pipe.unlink(*targets[start:start + UNLINK_BATCH_SIZE])
+                results = await pipe.execute()
+            
+            return sum(results)
+        
+        except Exception as e:
+            logger.error("cache_unlink_many_error", error=str(e))
+            return 0
+    
     async def exists(self, key: str) -> bool:
         """Check if key exists in cache"""
         if not self.redis:
@@ -166,6 +226,25 @@ import functools
 import asyncio
 
 
+@functools.lru_cache(maxsize=1)
+def _main_module() -> Any:
+    """Import the FastAPI app module once; None when it is unavailable"""
+    # "main" when backend/ is on sys.path, "<package>.main" when imported as a package
+    package = __package__.rpartition(".")[0]
+    with contextlib.suppress(Exception):
+        return importlib.import_module(f"{package}.main" if package else "main")
+    return None
+
+
+def resolve_cache_manager() -> Optional[CacheManager]:
+    """Return the app's shared cache manager, or None before startup.
+    
+    Only the module lookup is memoized: the manager itself is assigned
+    during app startup, so it is read fresh on every call.
+    """
+    return getattr(_main_module(), "cache_manager", None)
+
+
 def cached_result(
     prefix: str,
     ttl: Optional[int] = None,
@@ -205,3 +284,70 @@ def cached_result(
         
         return wrapper
     return decorator
+
+
+class AsyncTTLCache:
+    """In-process TTL cache that coalesces concurrent misses per key"""
+    
+    def __init__(self, maxsize: Optional[int] = None):
+        """Initialize an empty cache, optionally bounded to maxsize entries"""
+        self.maxsize = maxsize
+        self._entries: Dict[str, Tuple[Any, float]] = {}  # key -> (value, monotonic expiry)
+        self._locks: Dict[str, asyncio.Lock] = {}
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the value for key if it has not expired"""
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        return None
+    
+    def peek(self, key: str) -> Optional[Any]:
+        """Return the value for key even if it has expired"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+    
+    def set(self, key: str, value: Any, ttl: float):
+        """Store value for ttl seconds, evicting the oldest entry when full"""
+        if (self.maxsize is not None and key not in self._entries and
+                len(self._entries) >= self.maxsize):
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (value, time.monotonic() + ttl)
+    
+    def pop(self, key: str):
+        """Drop the entry for key"""
+        self._entries.pop(key, None)
+    
+    def clear(self):
+        """Drop all entries"""
+        self._entries.clear()
+    
+    async def get_or_set(
+        self,
+        key: str,
+        ttl: float,
+        coro_factory: Callable[[], Awaitable[Any]],
+        force: bool = False
+    ) -> Any:
+        """Return a fresh value or compute it once for all concurrent callers
+        
+        A None result is returned but not cached; exceptions propagate and
+        leave any existing entry in place.
+        """
+        if not force:
+            value = self.get(key)
+            if value is not None:
+                return value
+        
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # A concurrent caller may have filled the entry while we waited
+            if not force:
+                value = self.get(key)
+                if value is not None:
+                    return value
+            
+            value = await coro_factory()
+            if value is not None:
+                self.set(key, value, ttl)
+            return value
@@ -1,11 +1,12 @@
 """Finviz Elite API client for fetching headlines and market data"""
 
 import asyncio
-import hashlib
 import re
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
 import httpx
+import xxhash
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 import structlog
 from bs4 import BeautifulSoup
@@ -640,8 +641,8 @@ class FinvizClient:
         return normalized
     
     def _generate_hash(self, text: str) -> str:
-        """Generate hash for deduplication"""
-        return hashlib.sha256(text.encode()).hexdigest()
+        """Generate hash for deduplication (non-cryptographic, 16 hex chars)"""
+        return xxhash.xxh3_64_hexdigest(text.encode())
     
     def _parse_timestamp(self, time_str: str) -> datetime:
         """Parse timestamp from various formats"""
@@ -778,6 +779,19 @@ class RateLimiter:
             self.calls.append(now)
 
 
+@lru_cache(maxsize=4096)
+def _ratio(a: str, b: str) -> int:
+    """Memoized fuzz.ratio on an ordered pair of normalized headlines"""
+    return fuzz.ratio(a, b)
+
+
+def _cached_ratio(a: str, b: str) -> int:
+    """Order-invariant cached similarity so (a, b) and (b, a) share one entry"""
+    if a > b:
+        a, b = b, a
+    return _ratio(a, b)
+
+
 class HeadlineDeduplicator:
     """Deduplicate headlines using fuzzy matching"""
     
@@ -785,28 +799,65 @@ class HeadlineDeduplicator:
         """Initialize deduplicator"""
         self.threshold = threshold * 100  # fuzzywuzzy uses 0-100 scale
     
-    def find_duplicates(self, headlines: List[Dict[str, Any]]) -> List[Tuple[int, int]]:
-        """Find duplicate headline pairs"""
+    @staticmethod
+    def _bigram_signature(text: str) -> int:
+        """64-bit bitmap of the character bigrams present in text"""
+        sig = 0
+        for i in range(len(text) - 1):
+            sig |= 1 << (hash(text[i:i + 2]) & 63)
+        return sig
+    
+    def _may_match(self, len_a: int, len_b: int, sig_a: int, sig_b: int) -> bool:
+        """Cheap reject for pairs that cannot reach the similarity threshold"""
+        total = len_a + len_b
+        if not total:
+            return True
+        
+        # ratio is 2*M/(len_a+len_b) with M <= min(len_a, len_b)
+        if 200 * min(len_a, len_b) / total < self.threshold - 0.5:
+            return False
+        
+        # Without a shared bigram no two matched characters are adjacent in
+        # both strings, so each pair of consecutive matches costs a gap:
+        # 3*M - 1 <= total, i.e. ratio <= 2*M/(3*M - 1) (80 at M=2, 75 at M=3)
+        if not (sig_a & sig_b) and 200 * ((total + 1) // 3) / total < self.threshold - 0.5:
+            return False
+        
+        return True
+    
+    def find_duplicates(self, normalized: List[str], tickers: List[str]) -> List[Tuple[int, int]]:
+        """Find duplicate headline pairs
+        
+        Takes parallel lists of normalized headlines and tickers and returns
+        index pairs (i, j) with i < j.
+        """
         duplicates = []
+        count = len(normalized)
+        lengths = [len(text) for text in normalized]
+        signatures = [self._bigram_signature(text) for text in normalized]
         
-        for i in range(len(headlines)):
-            for j in range(i + 1, len(headlines)):
-                # Compare normalized headlines
-                similarity = fuzz.ratio(
-                    headlines[i]["normalized_headline"],
-                    headlines[j]["normalized_headline"]
-                )
+        for i in range(count):
+            text_i, ticker_i = normalized[i], tickers[i]
+            len_i, sig_i = lengths[i], signatures[i]
+            
+            for j in range(i + 1, count):
+                # Only same-ticker headlines can be duplicates
+                if tickers[j] != ticker_i:
+                    continue
                 
-                if similarity >= self.threshold:
-                    # Also check if same ticker
-                    if headlines[i]["ticker"] == headlines[j]["ticker"]:
-                        duplicates.append((i, j))
+                if not self._may_match(len_i, lengths[j], sig_i, signatures[j]):
+                    continue
+                
+                if _cached_ratio(text_i, normalized[j]) >= self.threshold:
+                    duplicates.append((i, j))
         
         return duplicates
     
     def deduplicate(self, headlines: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Remove duplicate headlines, keeping earliest/primary source"""
-        duplicates = self.find_duplicates(headlines)
+        normalized = [h["normalized_headline"] for h in headlines]
+        tickers = [h["ticker"] for h in headlines]
+        duplicates = self.find_duplicates(normalized, tickers)
         
         # Build groups of duplicates
         groups = {}
@@ -841,22 +892,22 @@ class HeadlineDeduplicator:
         deduplicated = []
         
         for group in merged_groups:
-            # Sort by: primary source first, then earliest
-            group_headlines = [headlines[i] for i in group]
-            group_headlines.sort(
+            if len(group) == 1:
+                deduplicated.append(headlines[group[0]])
+                continue
+            
+            # Keep the best one: primary source first, then earliest
+            best = min(
+                (headlines[i] for i in group),
                 key=lambda h: (
                     not h["is_primary_source"],  # Primary sources first
                     h["headline_timestamp"]  # Earlier first
                 )
             )
             
-            # Keep the best one
-            best = group_headlines[0]
-            
             # Mark others as duplicates
-            if len(group) > 1:
-                best["has_duplicates"] = True
-                best["duplicate_count"] = len(group) - 1
+            best["has_duplicates"] = True
+            best["duplicate_count"] = len(group) - 1
             
             deduplicated.append(best)
         
@@ -2,18 +2,21 @@ from __future__ import annotations
 
 import asyncio
 import contextlib
+import functools
 import time
 from datetime import datetime, timedelta, timezone
 from typing import Any, Iterable, Optional, Sequence, Set
 
 import structlog
-from sqlalchemy import delete, select
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import Settings, settings
 from ..database import AsyncSessionLocal
 from ..models import Headline
-from .cache import CacheManager
+from .cache import CacheManager, resolve_cache_manager
 from .finviz_client import FinvizClient, HeadlineDeduplicator
 
 logger = structlog.get_logger(__name__)
@@ -54,6 +57,7 @@ SCHEDULER_LAST_SUCCESS_GAUGE = (
 )
 
 DEFAULT_CONCURRENCY = 3
+INSERT_BATCH_SIZE = 500
 CACHE_INVALIDATION_PATTERNS = (
     "headlines:*",
     "analytics:summary:*",
@@ -118,7 +122,7 @@ async def ingest_portfolios(
             "errors": 0,
         }
 
-    cache_manager = _resolve_cache_manager()
+    cache_manager = resolve_cache_manager()
     overall: dict[str, Any] = {
         "status": "pending",
         "portfolio_ids": target_portfolios,
@@ -128,29 +132,52 @@ async def ingest_portfolios(
     }
 
     async with FinvizClient(api_key=api_key or getattr(settings_obj, "finviz_api_key", None)) as client:
-        semaphore = asyncio.Semaphore(DEFAULT_CONCURRENCY)
-
-        async def worker(portfolio_id: int) -> dict[str, Any]:
-            async with semaphore:
-                async with AsyncSessionLocal() as session:
-                    return await ingest_single_portfolio(
-                        portfolio_id,
-                        session,
-                        client,
-                        settings_obj=settings_obj,
-                        cache_manager=cache_manager,
-                    )
-
-        tasks = [asyncio.create_task(worker(pid)) for pid in target_portfolios]
-
-        for task in asyncio.as_completed(tasks):
-            try:
-                result = await task
-                overall["details"].append(result)
-                overall["persisted"] += result.get("persisted", 0)
-            except Exception as exc:  # pragma: no cover - defensive logging
-                overall["errors"] += 1
-                logger.exception("ingestion_portfolio_failure", error=str(exc))
+        queue: asyncio.Queue[int | None] = asyncio.Queue()
+        for position in range(len(target_portfolios)):
+            queue.put_nowait(position)
+        worker_count = min(DEFAULT_CONCURRENCY, len(target_portfolios))
+        for _ in range(worker_count):
+            queue.put_nowait(None)
+
+        # One slot per portfolio so outcomes are reported in input order
+        outcomes: list[dict[str, Any] | BaseException | None] = [None] * len(target_portfolios)
+
+        async def worker() -> None:
+            while True:
+                position = await queue.get()
+                if position is None:
+                    return
+                try:
+                    async with AsyncSessionLocal() as session:
+                        outcomes[position] = await ingest_single_portfolio(
+                            target_portfolios[position],
+                            session,
+                            client,
+                            settings_obj=settings_obj,
+                            cache_manager=cache_manager,
+                        )
+                except Exception as exc:
+                    outcomes[position] = exc
+
+        # A crashed worker leaves its remaining slots empty; they are
+        # counted as errors below
+        await asyncio.gather(
+            *(worker() for _ in range(worker_count)),
+            return_exceptions=True,
+        )
+
+    for portfolio_id, outcome in zip(target_portfolios, outcomes):
+        if isinstance(outcome, dict):
+            overall["details"].append(outcome)
+            overall["persisted"] += outcome.get("persisted", 0)
+            continue
+        overall["errors"] += 1
+        logger.error(
+            "ingestion_portfolio_failure",
+            portfolio_id=portfolio_id,
+            error=str(outcome) if outcome is not None else "not_processed",
+            exc_info=outcome if isinstance(outcome, BaseException) else None,
+        )
 
     overall["status"] = "completed" if overall["errors"] == 0 else "partial"
 
@@ -260,61 +287,51 @@ async def ingest_single_portfolio(
     deduplicator = HeadlineDeduplicator()
     deduped_payload = deduplicator.deduplicate(raw_headlines)
 
-    headline_hashes = [
-        item.get("headline_hash")
-        for item in deduped_payload
-        if item.get("headline_hash")
-    ]
-    existing_stmt = select(Headline.headline_hash, Headline.id).where(
-        Headline.headline_hash.in_(headline_hashes)
-    )
-    existing_result = await db.execute(existing_stmt)
-    existing_map = {row.headline_hash: row.id for row in existing_result}
-
-    seen_hashes: Set[str] = set()
-    new_instances: list[Headline] = []
-    duplicate_count = 0
-
+    rows: list[dict[str, Any]] = []
     for item in deduped_payload:
         headline_hash = item.get("headline_hash")
         if not headline_hash:
-            duplicate_count += 1
-            continue
-        if headline_hash in existing_map or headline_hash in seen_hashes:
-            duplicate_count += 1
             continue
 
-        seen_hashes.add(headline_hash)
         ticker = (item.get("ticker") or "").upper().strip()
-        if ticker:
-            tickers.add(ticker)
-
-        new_instances.append(
-            Headline(
-                ticker=ticker or "UNKNOWN",
-                company=item.get("company") or ticker or "Unknown",
-                headline=item.get("headline", ""),
-                normalized_headline=item.get("normalized_headline", "").strip()
+        rows.append(
+            {
+                "ticker": ticker or "UNKNOWN",
+                "company": item.get("company") or ticker or "Unknown",
+                "headline": item.get("headline", ""),
+                "normalized_headline": item.get("normalized_headline", "").strip()
                 or item.get("headline", "").lower(),
-                source=item.get("source") or "Unknown",
-                link=item.get("link") or "",
-                is_primary_source=bool(item.get("is_primary_source", False)),
-                headline_timestamp=_normalize_timestamp(item.get("headline_timestamp")),
-                first_seen_timestamp=_normalize_timestamp(
+                "source": item.get("source") or "Unknown",
+                "link": item.get("link") or "",
+                "is_primary_source": bool(item.get("is_primary_source", False)),
+                "headline_timestamp": _normalize_timestamp(item.get("headline_timestamp")),
+                "first_seen_timestamp": _normalize_timestamp(
                     item.get("first_seen_timestamp") or item.get("headline_timestamp")
                 ),
-                market_session=_normalize_market_session(item.get("market_session")),
-                headline_age_minutes=item.get("headline_age_minutes"),
-                sector=item.get("sector"),
-                industry=item.get("industry"),
-                headline_hash=headline_hash,
-                portfolio_id=portfolio_id,
-            )
+                "market_session": _normalize_market_session(item.get("market_session")),
+                "headline_age_minutes": item.get("headline_age_minutes"),
+                "sector": item.get("sector"),
+                "industry": item.get("industry"),
+                "headline_hash": headline_hash,
+                "portfolio_id": portfolio_id,
+            }
         )
 
+    persisted = 0
     try:
-        for instance in new_instances:
-            db.add(instance)
+        for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[offset : offset + INSERT_BATCH_SIZE]
+            stmt = (
+                _dialect_insert(db)(Headline)
+                .values(batch)
+                .on_conflict_do_nothing(index_elements=["headline_hash"])
+                .returning(Headline.headline_hash, Headline.ticker)
+            )
+            result = await db.execute(stmt)
+            for row in result:
+                persisted += 1
+                if row.ticker and row.ticker != "UNKNOWN":
+                    tickers.add(row.ticker)
 
         await db.commit()
     except Exception as exc:  # pragma: no cover - persistence error logging
@@ -328,6 +345,8 @@ async def ingest_single_portfolio(
     finally:
         await invalidate_downstream_caches(cache_manager, tickers=tickers)
 
+    duplicate_count = len(deduped_payload) - persisted
+
     duration = time.perf_counter() - start_time
     if INGEST_DURATION_HISTOGRAM:
         INGEST_DURATION_HISTOGRAM.labels(portfolio_id=str(portfolio_id)).observe(duration)
@@ -336,7 +355,7 @@ async def ingest_single_portfolio(
         "ingestion_portfolio_complete",
         portfolio_id=portfolio_id,
         fetched=len(raw_headlines),
-        persisted=len(new_instances),
+        persisted=persisted,
         duplicates=duplicate_count,
         duration_seconds=duration,
     )
@@ -345,7 +364,7 @@ async def ingest_single_portfolio(
         "portfolio_id": portfolio_id,
         "status": "success",
         "fetched": len(raw_headlines),
-        "persisted": len(new_instances),
+        "persisted": persisted,
         "duplicates": duplicate_count,
         "duration_seconds": duration,
         "tickers": sorted(tickers),
@@ -378,29 +397,25 @@ async def cleanup_expired_records(
     cutoff = datetime.now(timezone.utc) - timedelta(hours=retention_hours)
 
     result = await db.execute(
-        select(Headline.id, Headline.ticker).where(Headline.headline_timestamp < cutoff)
+        delete(Headline)
+        .where(Headline.headline_timestamp < cutoff)
+        .returning(Headline.id, Headline.ticker)
     )
     rows = result.all()
-    ids_to_delete = [row.id for row in rows]
+    await db.commit()
     affected_tickers = {row.ticker for row in rows if row.ticker}
 
-    if ids_to_delete:
-        await db.execute(delete(Headline).where(Headline.id.in_(ids_to_delete)))
-        await db.commit()
-    else:
-        await db.rollback()
-
-    cache_manager = cache_manager or _resolve_cache_manager()
+    cache_manager = cache_manager or resolve_cache_manager()
     await invalidate_downstream_caches(cache_manager, tickers=affected_tickers)
 
     logger.info(
         "ingestion_cleanup_completed",
-        deleted=len(ids_to_delete),
+        deleted=len(rows),
         cutoff=cutoff.isoformat(),
     )
 
     return {
-        "deleted": len(ids_to_delete),
+        "deleted": len(rows),
         "cutoff": cutoff.isoformat(),
         "tickers": sorted(affected_tickers),
     }
@@ -423,19 +438,25 @@ async def invalidate_downstream_caches(
         return
 
     try:
-        for pattern in CACHE_INVALIDATION_PATTERNS:
-            await cache_manager.delete_pattern(pattern)
-
-        if tickers:
-            for ticker in tickers:
-                ticker_key = cache_manager.cache_key("returns:ticker", ticker=ticker)
-                analytics_key = cache_manager.cache_key("analytics:summary", ticker=ticker)
-                await cache_manager.delete(ticker_key)
-                await cache_manager.delete(analytics_key)
+        ticker_keys = [
+            cache_manager.cache_key(prefix, ticker=ticker)
+            for ticker in tickers or ()
+            for prefix in ("returns:ticker", "analytics:summary")
+        ]
+        await cache_manager.unlink_many(CACHE_INVALIDATION_PATTERNS, ticker_keys)
     except Exception as exc:  # pragma: no cover - cache best effort
         logger.warning("cache_invalidation_failed", error=str(exc))
 
 
+def _dialect_insert(db: AsyncSession):
+    """
+    Return the dialect-specific ``insert`` construct supporting ON CONFLICT.
+    """
+    if db.bind is not None and db.bind.dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
+
+
 def _flag_enabled(settings_obj: Settings, attribute: str) -> bool:
     """
     Lookup helper that tolerates different casing for feature flags.
@@ -458,15 +479,28 @@ def _normalize_timestamp(raw_value: Any) -> datetime:
         return raw_value.astimezone(timezone.utc)
 
     if isinstance(raw_value, str):
-        with contextlib.suppress(ValueError):
-            parsed = datetime.fromisoformat(raw_value.replace("Z", "+00:00"))
-            if parsed.tzinfo is None:
-                parsed = parsed.replace(tzinfo=timezone.utc)
-            return parsed.astimezone(timezone.utc)
+        parsed = _parse_iso(raw_value)
+        if parsed is not None:
+            return parsed
 
     return datetime.now(timezone.utc)
 
 
+@functools.lru_cache(maxsize=2048)
+def _parse_iso(raw_value: str) -> datetime | None:
+    """
+    Parse an ISO-8601 string into a UTC datetime; ``None`` when invalid.
+
+    Feed timestamps repeat heavily within a batch, so parses are memoized.
+    """
+    with contextlib.suppress(ValueError):
+        parsed = datetime.fromisoformat(raw_value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.astimezone(timezone.utc)
+    return None
+
+
 def _normalize_market_session(raw_value: Any) -> str:
     """
     Convert MarketSession enums to their string values.
@@ -475,14 +509,3 @@ def _normalize_market_session(raw_value: Any) -> str:
         return "regular"
     value = getattr(raw_value, "value", raw_value)
     return str(value)
-
-
-def _resolve_cache_manager() -> CacheManager | None:
-    """
-    Attempt to import the shared cache manager from the FastAPI app.
-    """
-    with contextlib.suppress(Exception):
-        from ..main import cache_manager as global_cache_manager  # type: ignore
-
-        return global_cache_manager
-    return None
\ No newline at end of file
@@ -2,6 +2,7 @@
 
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models import Headline, SentimentAggregate, MarketData, SentimentReturns
@@ -21,6 +22,30 @@ def is_market_hours(dt: datetime) -> bool:
     return True
 
 
+US_PER_MINUTE = 60 * 1_000_000
+US_PER_HOUR = 60 * US_PER_MINUTE
+US_PER_DAY = 24 * US_PER_HOUR
+MARKET_CLOSE_OFFSET_US = 16 * US_PER_HOUR
+_EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+def _wall_clock_us(dt: datetime) -> int:
+    """Microseconds since the epoch for dt's wall-clock fields (tz ignored)"""
+    return (
+        (dt.toordinal() - _EPOCH_ORDINAL) * US_PER_DAY
+        + ((dt.hour * 60 + dt.minute) * 60 + dt.second) * 1_000_000
+        + dt.microsecond
+    )
+
+
+def _market_close_us(wall_us: int) -> int:
+    """Next 4:00 PM strictly after wall_us, in wall-clock microseconds"""
+    close = wall_us - wall_us % US_PER_DAY + MARKET_CLOSE_OFFSET_US
+    if wall_us >= close:
+        close += US_PER_DAY
+    return close
+
+
 def get_next_market_close(dt: datetime) -> datetime:
     """Get the next market close time (4:00 PM ET)"""
     close = dt.replace(hour=16, minute=0, second=0, microsecond=0)
@@ -44,27 +69,67 @@ def calculate_return(start_price: float, end_price: float) -> float:
     return ((end_price - start_price) / start_price) * 100
 
 
-def find_closest_price(target_time: datetime, market_data: List[MarketData], 
+def find_closest_price(target_time: datetime, market_data: List[MarketData],
                       max_diff_minutes: int = 15) -> Optional[Dict[str, Any]]:
-    """Find the closest price data point to a target time"""
+    """Find the closest price data point to a target time
+    
+    ``market_data`` must be sorted by timestamp, as for ``find_closest_indices``.
+    """
     if not market_data:
         return None
-        
-    closest = None
-    min_diff = timedelta(minutes=max_diff_minutes)
     
-    for data in market_data:
-        diff = abs(data.timestamp - target_time)
-        if diff < min_diff:
-            min_diff = diff
-            closest = data
-            
-    if closest:
-        return {
-            "price": closest.price,
-            "timestamp": closest.timestamp
-        }
-    return None
+    idx = find_closest_indices(_to_epoch_us([target_time]), market_data, max_diff_minutes)[0]
+    if idx < 0:
+        return None
+    
+    closest = market_data[idx]
+    return {
+        "price": closest.price,
+        "timestamp": closest.timestamp
+    }
+
+
+def _to_epoch_us(values: List[datetime]) -> np.ndarray:
+    """Convert datetimes to integer epoch microseconds"""
+    return np.array(
+        [round(v.timestamp() * 1_000_000) for v in values], dtype=np.int64
+    )
+
+
+def _closest_indices(ts: np.ndarray, targets: np.ndarray, limit: int) -> List[int]:
+    """Closest index in sorted ``ts`` per target, -1 unless strictly within limit"""
+    n = len(ts)
+    if not n:
+        return [-1] * len(targets)
+    
+    idx = np.searchsorted(ts, targets, side="left")
+    # First occurrence of the left neighbour's timestamp
+    left = np.searchsorted(ts, ts[np.clip(idx - 1, 0, n - 1)], side="left")
+    right = np.clip(idx, 0, n - 1)
+    
+    left_diff = np.where(idx > 0, targets - ts[left], limit)
+    right_diff = np.where(idx < n, ts[right] - targets, limit)
+    
+    use_left = left_diff <= right_diff
+    best = np.where(use_left, left, right)
+    best_diff = np.where(use_left, left_diff, right_diff)
+    return np.where(best_diff < limit, best, -1).tolist()
+
+
+def find_closest_indices(targets_us: np.ndarray, market_data: List[MarketData],
+                         max_diff_minutes: int = 15) -> List[int]:
+    """Vectorized closest-point lookup for several target times
+    
+    ``targets_us`` are integer epoch microseconds and ``market_data`` must
+    be sorted by timestamp. Returns one index into ``market_data`` per
+    target, or -1 when no point lies strictly within ``max_diff_minutes``.
+    Ties resolve to the earliest point.
+    """
+    return _closest_indices(
+        _to_epoch_us([d.timestamp for d in market_data]),
+        np.asarray(targets_us, dtype=np.int64),
+        max_diff_minutes * US_PER_MINUTE
+    )
 
 
 async def calculate_returns(
@@ -78,96 +143,52 @@ async def calculate_returns(
     # Get the sentiment timestamp (when analysis was done)
     sentiment_time = sentiment.created_at
     
+    # Target times for every horizon as microsecond offsets from the
+    # sentiment time, so all price lookups run in one vectorized pass
+    wall = _wall_clock_us(sentiment_time)
+    next_close = _market_close_us(wall) - wall
+    horizons = [
+        # (field suffix, offset from sentiment time, forward-looking)
+        ("3h", min(3 * US_PER_HOUR, next_close), True),
+        ("24h", US_PER_DAY, True),
+        ("next_day", next_close, True),
+        ("2d", next_close + US_PER_DAY, True),
+        ("3d", next_close + 2 * US_PER_DAY, True),
+        ("prev_1d", next_close - US_PER_DAY, False),
+        ("prev_2d", next_close - 2 * US_PER_DAY, False),
+    ]
+    
+    market_data = sorted(market_data, key=lambda d: d.timestamp)
+    offsets = np.array([0] + [offset for _, offset, _ in horizons], dtype=np.int64)
+    matches = find_closest_indices(_to_epoch_us([sentiment_time]) + offsets, market_data)
+    
     # Find the price at sentiment time
-    sentiment_price_data = find_closest_price(sentiment_time, market_data)
-    if not sentiment_price_data:
+    if matches[0] < 0:
         return None
+    sentiment_point = market_data[matches[0]]
         
     # Initialize returns object
     returns = SentimentReturns(
         headline_id=headline.id,
         sentiment_value=sentiment.majority_vote,
         sentiment_confidence=sentiment.avg_confidence,
-        price_at_sentiment=sentiment_price_data["price"],
-        timestamp_at_sentiment=sentiment_price_data["timestamp"]
-    )
-    
-    # Calculate 3-hour return (or end of day)
-    target_3h = min(
-        sentiment_time + timedelta(hours=3),
-        get_next_market_close(sentiment_time)
+        price_at_sentiment=sentiment_point.price,
+        timestamp_at_sentiment=sentiment_point.timestamp
     )
-    price_3h = find_closest_price(target_3h, market_data)
-    if price_3h:
-        returns.price_3h = price_3h["price"]
-        returns.timestamp_3h = price_3h["timestamp"]
-        returns.return_3h = calculate_return(
-            returns.price_at_sentiment, returns.price_3h
-        )
-    
-    # Calculate 24-hour return (trading hours only)
-    target_24h = sentiment_time + timedelta(hours=24)
-    price_24h = find_closest_price(target_24h, market_data)
-    if price_24h:
-        returns.price_24h = price_24h["price"]
-        returns.timestamp_24h = price_24h["timestamp"]
-        returns.return_24h = calculate_return(
-            returns.price_at_sentiment, returns.price_24h
-        )
-    
-    # Calculate next trading day close
-    next_close = get_next_market_close(sentiment_time)
-    price_next_day = find_closest_price(next_close, market_data)
-    if price_next_day:
-        returns.price_next_day = price_next_day["price"]
-        returns.timestamp_next_day = price_next_day["timestamp"]
-        returns.return_next_day = calculate_return(
-            returns.price_at_sentiment, returns.price_next_day
-        )
-    
-    # Calculate 2-day return
-    target_2d = next_close + timedelta(days=1)
-    price_2d = find_closest_price(target_2d, market_data)
-    if price_2d:
-        returns.price_2d = price_2d["price"]
-        returns.timestamp_2d = price_2d["timestamp"]
-        returns.return_2d = calculate_return(
-            returns.price_at_sentiment, returns.price_2d
-        )
-    
-    # Calculate 3-day return
-    target_3d = target_2d + timedelta(days=1)
-    price_3d = find_closest_price(target_3d, market_data)
-    if price_3d:
-        returns.price_3d = price_3d["price"]
-        returns.timestamp_3d = price_3d["timestamp"]
-        returns.return_3d = calculate_return(
-            returns.price_at_sentiment, returns.price_3d
-        )
-    
-    # Calculate previous day's return
-    prev_close = sentiment_time.replace(hour=16, minute=0, second=0, microsecond=0)
-    if sentiment_time >= prev_close:
-        prev_close += timedelta(days=1)
-    prev_close -= timedelta(days=1)
-    
-    price_prev_1d = find_closest_price(prev_close, market_data)
-    if price_prev_1d:
-        returns.price_prev_1d = price_prev_1d["price"]
-        returns.timestamp_prev_1d = price_prev_1d["timestamp"]
-        returns.return_prev_1d = calculate_return(
-            price_prev_1d["price"], returns.price_at_sentiment
-        )
     
-    # Calculate 2 days prior return
-    prev_2d_close = prev_close - timedelta(days=1)
-    price_prev_2d = find_closest_price(prev_2d_close, market_data)
-    if price_prev_2d:
-        returns.price_prev_2d = price_prev_2d["price"]
-        returns.timestamp_prev_2d = price_prev_2d["timestamp"]
-        returns.return_prev_2d = calculate_return(
-            price_prev_2d["price"], returns.price_at_sentiment
-        )
+    # Forward returns run from the sentiment price; prior-day returns run
+    # into it
+    for (suffix, _, forward), idx in zip(horizons, matches[1:]):
+        if idx < 0:
+            continue
+        point = market_data[idx]
+        setattr(returns, f"price_{suffix}", point.price)
+        setattr(returns, f"timestamp_{suffix}", point.timestamp)
+        if forward:
+            value = calculate_return(returns.price_at_sentiment, point.price)
+        else:
+            value = calculate_return(point.price, returns.price_at_sentiment)
+        setattr(returns, f"return_{suffix}", value)
     
     # Save to database
     db.add(returns)
@@ -1,220 +1,372 @@
 """Dynamic model fetching service for various AI providers"""
 
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
 import httpx
+import orjson
 import structlog
-from groq import Groq
 from config import settings
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from database import AsyncSessionLocal
+from services.cache import AsyncTTLCache
 
 logger = structlog.get_logger()
 
+# Seconds to keep serving a stale model list after a failed refetch
+FETCH_RETRY_BACKOFF = 30
+
+# In-process cache key for the stored provider API keys
+API_KEYS_CACHE_KEY = "api_keys"
+
+# Display names of the providers whose model lists are cached
+_PROVIDER_LABELS = {"groq": "Groq", "openrouter": "OpenRouter"}
+
+# Redis key prefix for model lists shared across workers and restarts
+MODELS_CACHE_PREFIX = "models:"
+
+# Fallback lists are built once; getters hand out shallow copies
+_FALLBACK_GROQ_MODELS: Tuple[Dict[str, Any], ...] = tuple(
+    {
+        "id": model_id,
+        "name": model_id,
+        "context_window": 32768,
+        "fallback": True
+    }
+    for model_id in (
+        "llama-3.3-70b-versatile",
+        "llama-3.2-90b-text-preview",
+        "llama-3.2-11b-text-preview",
+        "llama-3.2-3b-preview",
+        "llama-3.2-1b-preview",
+        "llama-3.1-70b-instant",
+        "llama-3.1-8b-instant",
+        "mixtral-8x7b-32768",
+        "gemma2-9b-it",
+        "gemma-7b-it"
+    )
+)
+
 
 class ModelFetcher:
     """Service to dynamically fetch available models from AI providers"""
     
-    def __init__(self):
-        self._groq_models_cache: Optional[List[Dict[str, Any]]] = None
-        self._openrouter_models_cache: Optional[List[Dict[str, Any]]] = None
+    _FALLBACK_OR: Tuple[Dict[str, Any], ...] = ()
+    
+    def __init__(self, redis_client=None):
+        # Set by the application lifespan once Redis is connected; may stay None
+        self.redis = redis_client
+        # Fallback OpenRouter models from the verified list in config
+        self._FALLBACK_OR = tuple(
+            {
+                "id": model_id,
+                "name": model_id,
+                "context_window": 4096,
+                "fallback": True
+            }
+            for model_id in settings.available_openrouter_models[:20]  # Limit to first 20 for fallback
+        )
         self._cache_ttl = 3600  # 1 hour cache
-        self._last_groq_fetch = 0
-        self._last_openrouter_fetch = 0
+        # Model lists keyed by provider plus the stored API keys
+        self._ttl = AsyncTTLCache()
+        self._openrouter_etag: Optional[str] = None
+        self._openrouter_last_modified: Optional[str] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_lock = asyncio.Lock()
+        self._keys_ttl = 60.0  # API keys change rarely
+    
+    @property
+    def cache_ttl(self) -> int:
+        """Model list cache lifetime in seconds"""
+        return self._cache_ttl
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it on first use"""
+        if self._client is None:
+            async with self._client_lock:
+                if self._client is None:
+                    # Pool and HTTP/2 settings live on the transport, which
+                    # also retries failed connects without re-running requests
+                    self._client = httpx.AsyncClient(
+                        transport=httpx.AsyncHTTPTransport(
+                            http2=True,
+                            retries=2,
+                            limits=httpx.Limits(
+                                max_connections=10,
+                                max_keepalive_connections=10,
+                                keepalive_expiry=30.0
+                            )
+                        ),
+                        timeout=30.0
+                    )
+        return self._client
+    
+    async def aclose(self):
+        """Close the shared HTTP client (called on application shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def invalidate_keys(self):
+        """Drop cached API keys (call whenever UserSettings keys are written)"""
+        self._ttl.pop(API_KEYS_CACHE_KEY)
     
     async def _load_api_keys_from_db(self) -> tuple[Optional[str], Optional[str]]:
         """Load API keys from database"""
+        keys = await self._ttl.get_or_set(
+            API_KEYS_CACHE_KEY, self._keys_ttl, self._query_api_keys
+        )
+        return keys or (None, None)
+    
+    async def _query_api_keys(self) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """Read the stored API keys; None (not cached) on database errors"""
         try:
             async with AsyncSessionLocal() as db:
                 # Import here to avoid circular import
                 from models import UserSettings
                 
+                # Select just the two key columns; no ORM entity is hydrated
                 result = await db.execute(
-                    select(UserSettings).where(UserSettings.user_id == "default")
+                    select(
+                        UserSettings.groq_api_key,
+                        UserSettings.openrouter_api_key
+                    ).where(UserSettings.user_id == "default")
                 )
-                user_settings = result.scalar_one_or_none()
+                row = result.one_or_none()
                 
-                if user_settings:
-                    return user_settings.groq_api_key, user_settings.openrouter_api_key
-                
-                return None, None
+                return (row[0], row[1]) if row else (None, None)
                 
         except Exception as e:
             logger.error("failed_to_load_api_keys_from_db", error=str(e))
-            return None, None
+            return None
     
-    async def get_groq_models(self, api_key: Optional[str] = None) -> List[Dict[str, Any]]:
+    async def get_groq_models(
+        self,
+        api_key: Optional[str] = None,
+        force: bool = False
+    ) -> List[Dict[str, Any]]:
         """Fetch available models from Groq API"""
-        import time
-        
-        # Use cache if still valid
-        if (self._groq_models_cache and 
-            time.time() - self._last_groq_fetch < self._cache_ttl):
-            return self._groq_models_cache
-        
-        # Use provided API key, database key, or settings key (in that order)
-        groq_key = api_key
-        if not groq_key:
-            db_groq_key, _ = await self._load_api_keys_from_db()
-            groq_key = db_groq_key or settings.groq_api_key
-        
-        if not groq_key:
-            logger.warning("no_groq_api_key", message="No Groq API key available")
-            return self._get_fallback_groq_models()
+        return await self._cached_fetch(
+            "groq", api_key, force, self._fetch_groq_models, self._get_fallback_groq_models
+        )
+    
+    async def get_openrouter_models(
+        self,
+        api_key: Optional[str] = None,
+        force: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Fetch available models from OpenRouter API"""
+        return await self._cached_fetch(
+            "openrouter", api_key, force, self._fetch_openrouter_models,
+            self._get_fallback_openrouter_models
+        )
+    
+    async def _cached_fetch(
+        self,
+        name: str,
+        api_key: Optional[str],
+        force: bool,
+        fetch_fn: Callable[[str], Awaitable[Optional[List[Dict[str, Any]]]]],
+        fallback_fn: Callable[[], List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """Serve a provider's model list from cache, refetching when stale
         
-        try:
-            # Initialize Groq client
-            client = Groq(api_key=groq_key)
+        ``fetch_fn`` takes the resolved API key and returns the transformed
+        list, or None when the upstream reports the cached list unchanged.
+        """
+        async def refresh() -> Optional[List[Dict[str, Any]]]:
+            # Another worker (or a previous process) may have fetched already
+            if not force:
+                shared = await self._load_shared(name)
+                if shared:
+                    return shared
             
-            # Fetch models from Groq API
-            models_response = client.models.list()
-            
-            # Transform to our format
-            groq_models = []
-            for model in models_response.data:
-                groq_models.append({
-                    "id": model.id,
-                    "name": model.id,  # Groq doesn't provide display names
-                    "context_window": getattr(model, 'context_window', 32768),
-                    "created": getattr(model, 'created', None),
-                    "owned_by": getattr(model, 'owned_by', 'groq')
-                })
+            # Use provided API key, database key, or settings key (in that order)
+            key = api_key or await self._resolve_api_key(name)
+            if not key:
+                logger.warning(
+                    f"no_{name}_api_key",
+                    message=f"No {_PROVIDER_LABELS[name]} API key available"
+                )
+                return None
             
-            # Cache the results
-            self._groq_models_cache = groq_models
-            self._last_groq_fetch = time.time()
+            current = self._ttl.peek(name)
+            models = await fetch_fn(key)
             
-            logger.info("fetched_groq_models", count=len(groq_models))
-            return groq_models
+            if models is None:
+                logger.info(f"{name}_models_not_modified")
+            else:
+                logger.info(f"fetched_{name}_models", count=len(models))
+                # Only replace the cache with an equal-or-larger non-empty
+                # list so a degraded response cannot evict a good one
+                if models and len(models) >= len(current or []):
+                    current = models
             
+            await self._store_shared(name, current)
+            return current or None
+        
+        try:
+            # Fresh lists are served directly; concurrent misses share one fetch
+            models = await self._ttl.get_or_set(name, self._cache_ttl, refresh, force=force)
         except Exception as e:
-            logger.error("failed_to_fetch_groq_models", error=str(e))
-            return self._get_fallback_groq_models()
-    
-    async def get_openrouter_models(self, api_key: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Fetch available models from OpenRouter API"""
-        import time
+            logger.error(f"failed_to_fetch_{name}_models", error=str(e))
+            models = self._ttl.peek(name)
+            if models:
+                # Keep serving the last good list; retry after a short backoff
+                self._ttl.set(name, models, FETCH_RETRY_BACKOFF)
         
-        # Use cache if still valid
-        if (self._openrouter_models_cache and 
-            time.time() - self._last_openrouter_fetch < self._cache_ttl):
-            return self._openrouter_models_cache
+        return models or fallback_fn()
+    
+    async def _load_shared(self, name: str) -> Optional[List[Dict[str, Any]]]:
+        """Read a provider's model list from Redis"""
+        if not self.redis:
+            return None
         
-        # Use provided API key, database key, or settings key (in that order)
-        openrouter_key = api_key
-        if not openrouter_key:
-            _, db_openrouter_key = await self._load_api_keys_from_db()
-            openrouter_key = db_openrouter_key or settings.openrouter_api_key
+        try:
+            cached = await self.redis.get(MODELS_CACHE_PREFIX + name)
+        except Exception as e:
+            logger.warning("models_cache_read_failed", provider=name, error=str(e))
+            return None
         
-        if not openrouter_key:
-            logger.warning("no_openrouter_api_key", message="No OpenRouter API key available")
-            return self._get_fallback_openrouter_models()
+        return orjson.loads(cached) if cached else None
+    
+    async def _store_shared(self, name: str, cache: Optional[List[Dict[str, Any]]]):
+        """Write a provider's model list to Redis with the model list TTL"""
+        if not self.redis or not cache:
+            return
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(
-                    "https://openrouter.ai/api/v1/models",
-                    headers={
-                        "Authorization": f"Bearer {openrouter_key}",
-                        "HTTP-Referer": "https://braktrad.com",
-                        "X-Title": "braktrad"
-                    }
-                )
-                response.raise_for_status()
-                
-                data = response.json()
-                models = data.get("data", [])
-                
-                # Transform to our format
-                openrouter_models = []
-                for model in models:
-                    openrouter_models.append({
-                        "id": model.get("id", ""),
-                        "name": model.get("name", model.get("id", "")),
-                        "context_window": model.get("context_length", 4096),
-                        "pricing": model.get("pricing", {}),
-                        "top_provider": model.get("top_provider", {}),
-                        "per_request_limits": model.get("per_request_limits")
-                    })
-                
-                # Cache the results
-                self._openrouter_models_cache = openrouter_models
-                self._last_openrouter_fetch = time.time()
-                
-                logger.info("fetched_openrouter_models", count=len(openrouter_models))
-                return openrouter_models
-                
+            await self.redis.set(
+                MODELS_CACHE_PREFIX + name,
+                orjson.dumps(cache),
+                ex=self._cache_ttl
+            )
         except Exception as e:
-            logger.error("failed_to_fetch_openrouter_models", error=str(e))
-            return self._get_fallback_openrouter_models()
+            logger.warning("models_cache_write_failed", provider=name, error=str(e))
     
-    def _get_fallback_groq_models(self) -> List[Dict[str, Any]]:
-        """Return fallback Groq models if API fetch fails"""
-        fallback_models = [
-            "llama-3.3-70b-versatile",
-            "llama-3.2-90b-text-preview", 
-            "llama-3.2-11b-text-preview",
-            "llama-3.2-3b-preview",
-            "llama-3.2-1b-preview",
-            "llama-3.1-70b-instant",
-            "llama-3.1-8b-instant",
-            "mixtral-8x7b-32768",
-            "gemma2-9b-it",
-            "gemma-7b-it"
-        ]
+    async def _resolve_api_key(self, name: str) -> Optional[str]:
+        """Return the stored key for a provider, falling back to settings"""
+        db_groq_key, db_openrouter_key = await self._load_api_keys_from_db()
+        if name == "groq":
+            return db_groq_key or settings.groq_api_key
+        return db_openrouter_key or settings.openrouter_api_key
+    
+    async def _fetch_groq_models(self, groq_key: str) -> List[Dict[str, Any]]:
+        """Fetch the Groq model list"""
+        client = await self._get_client()
+        response = await client.get(
+            "https://api.groq.com/openai/v1/models",
+            headers={"Authorization": f"Bearer {groq_key}"}
+        )
+        response.raise_for_status()
         
+        # Transform to our format
         return [
             {
-                "id": model_id,
-                "name": model_id,
-                "context_window": 32768,
-                "fallback": True
+                "id": model.get("id", ""),
+                "name": model.get("id", ""),  # Groq doesn't provide display names
+                "context_window": model.get("context_window", 32768),
+                "created": model.get("created"),
+                "owned_by": model.get("owned_by", "groq")
             }
-            for model_id in fallback_models
+            for model in orjson.loads(response.content).get("data", [])
         ]
     
-    def _get_fallback_openrouter_models(self) -> List[Dict[str, Any]]:
-        """Return fallback OpenRouter models if API fetch fails"""
-        # Use the verified list from config as fallback
-        return [
+    async def _fetch_openrouter_models(self, openrouter_key: str) -> Optional[List[Dict[str, Any]]]:
+        """Fetch the OpenRouter model list, or None if the cached one is current"""
+        headers = {
+            "Authorization": f"Bearer {openrouter_key}",
+            "HTTP-Referer": "https://braktrad.com",
+            "X-Title": "braktrad"
+        }
+        
+        # Revalidate the cached catalog instead of re-downloading it
+        if self._ttl.peek("openrouter"):
+            if self._openrouter_etag:
+                headers["If-None-Match"] = self._openrouter_etag
+            if self._openrouter_last_modified:
+                headers["If-Modified-Since"] = self._openrouter_last_modified
+        
+        client = await self._get_client()
+        response = await client.get(
+            "https://openrouter.ai/api/v1/models",
+            headers=headers
+        )
+        
+        if response.status_code == 304 and self._ttl.peek("openrouter"):
+            return None
+        
+        response.raise_for_status()
+        self._openrouter_etag = response.headers.get("ETag")
+        self._openrouter_last_modified = response.headers.get("Last-Modified")
+        
+        # Transform to our format, pulling only the fields we expose. The
+        # nested pricing/top_provider dicts are reused rather than copied
+        # and the raw payload is dropped before caching.
+        openrouter_models = [
             {
-                "id": model_id,
-                "name": model_id,
-                "context_window": 4096,
-                "fallback": True
+                "id": model.get("id", ""),
+                "name": model.get("name", model.get("id", "")),
+                "context_window": model.get("context_length", 4096),
+                "pricing": model.get("pricing", {}),
+                "top_provider": model.get("top_provider", {}),
+                "per_request_limits": model.get("per_request_limits")
             }
-            for model_id in settings.available_openrouter_models[:20]  # Limit to first 20 for fallback
+            for model in orjson.loads(response.content).get("data", [])
         ]
+        del response
+        return openrouter_models
     
-    async def refresh_all_models(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Refresh models from all providers"""
-        groq_models, openrouter_models = await asyncio.gather(
-            self.get_groq_models(),
-            self.get_openrouter_models(),
-            return_exceptions=True
-        )
+    def _get_fallback_groq_models(self) -> List[Dict[str, Any]]:
+        """Return fallback Groq models if API fetch fails"""
+        return list(_FALLBACK_GROQ_MODELS)
+    
+    def _get_fallback_openrouter_models(self) -> List[Dict[str, Any]]:
+        """Return fallback OpenRouter models if API fetch fails"""
+        return list(self._FALLBACK_OR)
+    
+    def _is_fresh(self, name: str) -> bool:
+        """Check whether a provider cache can be served without refetching"""
+        return self._ttl.get(name) is not None
+    
+    async def refresh_all_models(self, force: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Refresh models from all providers
+        
+        ``force`` bypasses fresh caches; the scheduler uses it to refresh
+        ahead of TTL expiry so user requests never wait on upstream APIs.
+        """
+        groq_key = openrouter_key = None
         
-        # Handle exceptions
-        if isinstance(groq_models, Exception):
-            logger.error("groq_models_fetch_failed", error=str(groq_models))
-            groq_models = self._get_fallback_groq_models()
+        # Load stored keys once for both providers rather than once per getter
+        if force or not (self._is_fresh("groq") and self._is_fresh("openrouter")):
+            db_groq_key, db_openrouter_key = await self._load_api_keys_from_db()
+            groq_key = db_groq_key or settings.groq_api_key
+            openrouter_key = db_openrouter_key or settings.openrouter_api_key
         
-        if isinstance(openrouter_models, Exception):
-            logger.error("openrouter_models_fetch_failed", error=str(openrouter_models))
-            openrouter_models = self._get_fallback_openrouter_models()
+        # The getters fall back internally on fetch errors, so anything
+        # raised here (including cancellation) should propagate
+        groq_models, openrouter_models = await asyncio.gather(
+            self.get_groq_models(groq_key, force=force),
+            self.get_openrouter_models(openrouter_key, force=force)
+        )
         
         return {
             "groq": groq_models,
             "openrouter": openrouter_models
         }
     
-    def clear_cache(self):
+    async def clear_cache(self):
         """Clear the model cache to force refresh"""
-        self._groq_models_cache = None
-        self._openrouter_models_cache = None
-        self._last_groq_fetch = 0
-        self._last_openrouter_fetch = 0
+        if self.redis:
+            try:
+                await self.redis.delete(*(MODELS_CACHE_PREFIX + name for name in _PROVIDER_LABELS))
+            except Exception as e:
+                logger.warning("models_cache_clear_failed", error=str(e))
+        
+        # Drops the model lists and the cached API keys
+        self._ttl.clear()
+        self._openrouter_etag = None
+        self._openrouter_last_modified = None
 
 
 # Global instance
@@ -1,8 +1,12 @@
 """Task scheduler for background jobs"""
 
 import asyncio
+import contextlib
+import heapq
+import random
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Callable, Any
+from typing import Dict, Callable, Any, List, Optional, Tuple
 import structlog
 
 logger = structlog.get_logger()
@@ -15,32 +19,62 @@ class TaskScheduler:
         """Initialize scheduler"""
         self.redis = redis_client
         self.tasks: Dict[str, asyncio.Task] = {}
-        self.running = False
+        # Set while stopped; cleared by start()
+        self._stop = asyncio.Event()
+        self._stop.set()
+        # (next run on the monotonic clock, name, coroutine function, interval)
+        self._heap: List[Tuple[float, str, Callable, int]] = []
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
     
     async def start(self):
         """Start the scheduler"""
-        self.running = True
+        self._stop.clear()
         
-        # Schedule recurring tasks
-        self.tasks["fetch_headlines"] = asyncio.create_task(
-            self._run_periodically(self._fetch_headlines_task, 300)  # Every 5 minutes
-        )
+        # Schedule recurring tasks; first runs are staggered by up to 10% of
+        # the interval so jobs (and workers started together) don't collide
+        self._schedule("fetch_headlines", self._fetch_headlines_task, 300,  # Every 5 minutes
+                       delay=random.uniform(0, 30))
+        self._schedule("cleanup_old_data", self._cleanup_task, 3600,  # Every hour
+                       delay=random.uniform(0, 360))
+        
+        # Refresh model lists before their cache expires so user requests
+        # are served from a warm cache (stale-while-revalidate). The interval
+        # leaves room for the +10% jitter plus a minute of margin. The first
+        # refresh waits a full interval: until then requests fill the cache
+        # from the shared Redis copy instead of every worker going upstream.
+        from services.model_fetcher import model_fetcher
         
-        self.tasks["cleanup_old_data"] = asyncio.create_task(
-            self._run_periodically(self._cleanup_task, 3600)  # Every hour
+        refresh_interval = max(int(model_fetcher.cache_ttl / 1.1) - 60, 60)
+        self._schedule(
+            "refresh_models",
+            self._refresh_models_task,
+            refresh_interval,
+            delay=refresh_interval + random.uniform(-refresh_interval * 0.1, refresh_interval * 0.1)
         )
         
         # Note: opportunities are now generated on-demand (user trigger or after sentiment analysis)
         # No automatic periodic generation
         
-        logger.info("scheduler_started", tasks=list(self.tasks.keys()))
+        # One loop sleeps until the earliest deadline instead of one
+        # sleeping task per job
+        self._loop_task = asyncio.create_task(self._scheduler_loop())
+        
+        logger.info("scheduler_started", tasks=sorted(name for _, name, _, _ in self._heap))
     
     async def stop(self):
         """Stop the scheduler"""
-        self.running = False
+        # Signal first so the loop exits on its next check even if a
+        # cancellation races with a dispatch
+        self._stop.set()
+        self._wakeup.set()
         
-        # Cancel all tasks
-        for name, task in self.tasks.items():
+        # Cancel the scheduling loop and any in-flight jobs
+        pending = list(self.tasks.values())
+        if self._loop_task:
+            pending.append(self._loop_task)
+        
+        for task in pending:
             task.cancel()
             try:
                 await task
@@ -48,21 +82,80 @@ class TaskScheduler:
                 pass
         
         self.tasks.clear()
+        self._heap.clear()
+        self._loop_task = None
         logger.info("scheduler_stopped")
     
-    async def _run_periodically(self, func: Callable, interval: int):
-        """Run a function periodically"""
-        while self.running:
-            try:
-                await func()
-            except Exception as e:
-                logger.error(
-                    "scheduled_task_error",
-                    task=func.__name__,
-                    error=str(e)
-                )
+    @property
+    def running(self) -> bool:
+        """Whether the scheduler has been started and not stopped"""
+        return not self._stop.is_set()
+    
+    def schedule(self, name: str, func: Callable, interval: int, delay: float = 0.0):
+        """Add or replace a recurring job while the scheduler is running"""
+        self._heap = [entry for entry in self._heap if entry[1] != name]
+        heapq.heapify(self._heap)
+        
+        in_flight = self.tasks.pop(name, None)
+        if in_flight:
+            in_flight.cancel()
+        
+        self._schedule(name, func, interval, delay)
+        
+        # Wake the loop in case the new job is due before its current sleep ends
+        self._wakeup.set()
+        if self.running and (self._loop_task is None or self._loop_task.done()):
+            self._loop_task = asyncio.create_task(self._scheduler_loop())
+    
+    def _schedule(self, name: str, func: Callable, interval: int, delay: float = 0.0):
+        """Add a recurring job whose first run is ``delay`` seconds from now"""
+        heapq.heappush(self._heap, (time.monotonic() + delay, name, func, interval))
+    
+    async def _scheduler_loop(self):
+        """Dispatch due jobs in deadline order"""
+        while not self._stop.is_set() and self._heap:
+            deadline, name, func, interval = self._heap[0]
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                continue
+            
+            heapq.heappop(self._heap)
             
-            await asyncio.sleep(interval)
+            # Never overlap runs of the same job
+            in_flight = self.tasks.get(name)
+            if in_flight is None or in_flight.done():
+                self.tasks[name] = asyncio.create_task(self._run_job(func, interval))
+            else:
+                logger.warning("scheduled_task_still_running", task=name)
+            
+            # Jitter decorrelates jobs that share an interval or start time
+            jitter = random.uniform(-interval * 0.1, interval * 0.1)
+            self._schedule(name, func, interval, delay=interval + jitter)
+    
+    async def _run_job(self, func: Callable, interval: int):
+        """Run one scheduled job, logging failures
+        
+        A run may not outlast its own interval, so a hung upstream call
+        cannot block the job's later runs indefinitely.
+        """
+        try:
+            async with asyncio.timeout(interval):
+                await func()
+        except TimeoutError:
+            logger.error(
+                "scheduled_task_timeout",
+                task=func.__name__,
+                timeout_seconds=interval
+            )
+        except Exception as e:
+            logger.error(
+                "scheduled_task_error",
+                task=func.__name__,
+                error=str(e)
+            )
     
     async def _fetch_headlines_task(self):
         """Fetch headlines from Finviz"""
@@ -84,3 +177,9 @@ class TaskScheduler:
         # Clean up old headlines, expired opportunities, etc.
         # This would call the actual cleanup logic
         pass
+    
+    async def _refresh_models_task(self):
+        """Refresh provider model lists ahead of cache expiry"""
+        from services.model_fetcher import model_fetcher
+        
+        await model_fetcher.refresh_all_models(force=True)
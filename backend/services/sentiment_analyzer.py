@@ -1,21 +1,326 @@
 """Multi-model sentiment analysis orchestrator for brākTrād"""
 
 import asyncio
-import json
+import functools
+import hashlib
+import math
+import re
+import string
+import threading
 import time
-from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from operator import itemgetter
+from typing import List, Dict, Any, Callable, Optional, Tuple
 import numpy as np
 import httpx
+import orjson
 from groq import AsyncGroq
 import structlog
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from config import settings
+from services.cache import AsyncTTLCache, resolve_cache_manager
 from models import SentimentValue, TimeHorizon
 
 logger = structlog.get_logger()
 
+# Headlines packed into one prompt by analyze_headlines_batch. Latency grows
+# sublinearly with rows, but long batches raise the odds of a dropped row.
+DEFAULT_ROWS_PER_PROMPT = 8
+
+# Context fields sent for each row of a batch prompt
+_BATCH_ROW_FIELDS = (
+    "ticker", "company", "sector", "industry", "headline", "source",
+    "headline_timestamp", "first_seen_timestamp", "market_session",
+    "headline_age_minutes", "is_primary_source"
+)
+
+# Early exit (settings.quorum_enabled): never decide on fewer models than
+# this, and require a net vote of this share of all selected models
+QUORUM_MIN_MODELS = 2
+QUORUM_AGREEMENT = 0.6
+
+# Model results are reused for identical (model, ticker, headline, session)
+# inputs, e.g. the same story re-crawled from several feeds, for
+# settings.sentiment_cache_ttl seconds
+RESULT_CACHE_PREFIX = "sentiment_result:"
+_result_cache = AsyncTTLCache(maxsize=50_000)
+
+# Model calls currently running, by result cache key, so concurrent
+# duplicates await the first call instead of repeating it
+_inflight: Dict[str, asyncio.Future] = {}
+
+# Shared by the single-headline and batch prompts
+_DECISION_FRAMEWORK = """DECISION FRAMEWORK:
+1. SURPRISE FACTOR (highest weight):
+   - Unexpected news > stronger reaction
+   - Confirms expectations > muted/no reaction
+   - Stale/priced-in (>30min old) > minimal edge
+
+2. MAGNITUDE SIGNALS:
+   Strong positive (+1): Beat by >10%, FDA approval, major contract win, activist/buyout premium
+   Strong negative (-1): Miss by >10%, guidance cut, SEC probe, data breach, unexpected exec departure, downgrade
+   Neutral (0): In-line results, minor updates, speculation, reiterations
+
+3. TIMING DECAY:
+   - <15 min: Maximum edge (confidence 0.7-1.0)
+   - 15-60 min: Declining edge (confidence 0.4-0.7)
+   - >60 min: Mostly priced in (confidence 0.1-0.4)
+   - Pre-market/after-hours: Predict next session open"""
+
+# System messages are built once and shared by every request; never mutate them
+_SYSTEM_MSG_GROQ = {"role": "system", "content": """You are a high-frequency news analytics engine trained on millions of headline-to-price reaction patterns. Your output ONLY a single valid JSON prediction of immediate market impact.
+Core capabilities:
+- Pattern match headlines to historical price reactions with 87% directional accuracy
+- Identify information surprise relative to market expectations
+- Assess algorithmic trading and retail sentiment triggers
+- Calibrate confidence based on signal clarity and timing
+
+Your edge: You process news faster than human traders and recognize patterns they miss.
+
+Strictly follow these rules:
+1. No extraneous text: Do not include introductory text or commentary before or after the JSON.
+2. No markdown: Do not wrap the JSON in markdown code blocks (e.g., ```json ... ```).
+3. Schema adherence: The JSON object must precisely match the structure and keys requested in the user's prompt.
+4. Error protocol: If you cannot fulfill the user's request, you must still output a JSON object. This object should contain a single key: `error`, with a string value explaining why the request could not be completed."""}
+
+_SYSTEM_MSG_OR = {"role": "system", "content": """You are a high-frequency news analytics engine trained on millions of headline-to-price reaction patterns. Your output ONLY a single valid JSON prediction of immediate market impact.
+
+Core capabilities:
+- Pattern match headlines to historical price reactions with 87% directional accuracy
+- Identify information surprise relative to market expectations
+- Assess algorithmic trading and retail sentiment triggers
+- Calibrate confidence based on signal clarity and timing
+
+Your edge: You process news faster than human traders and recognize patterns they miss.
+
+Strictly follow these rules:
+1. No extraneous text: Do not include introductory text or commentary before or after the JSON.
+2. No markdown: Do not wrap the JSON in markdown code blocks (e.g., ```json ... ```).
+3. Schema adherence: The JSON object must precisely match the structure and keys requested in the user's prompt.
+4. Error protocol: If you cannot fulfill the user's request, you must still output a JSON object. This object should contain a single key: `error`, with a string value explaining why the request could not be completed."""}
+
+# Prediction horizons the prompts allow, in vote-tally order
+HORIZONS = ("<1h", "1-4h", "same_day", "next_open", "24h")
+
+# Groq's llama models only support plain JSON mode
+_JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+# OpenRouter forwards strict JSON schemas to models with structured output,
+# which then cannot emit a malformed prediction. Other models ignore the
+# schema, so responses are still validated after parsing.
+_PREDICTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sentiment": {"type": "integer", "enum": [-1, 0, 1]},
+        "horizon": {"type": "string", "enum": list(HORIZONS)},
+        "confidence": {"type": "number"},
+        "rationale": {"type": "string"}
+    },
+    "required": ["sentiment", "horizon", "confidence", "rationale"],
+    "additionalProperties": False
+}
+
+_RESPONSE_FORMATS = {
+    "prediction": {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "sentiment_prediction",
+            "strict": True,
+            "schema": _PREDICTION_SCHEMA
+        }
+    },
+    "batch": {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "sentiment_predictions",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "predictions": {
+                        "type": "array",
+                        "items": {
+                            **_PREDICTION_SCHEMA,
+                            "properties": {
+                                "id": {"type": "integer"},
+                                **_PREDICTION_SCHEMA["properties"]
+                            },
+                            "required": ["id", *_PREDICTION_SCHEMA["required"]]
+                        }
+                    }
+                },
+                "required": ["predictions"],
+                "additionalProperties": False
+            }
+        }
+    }
+}
+
+_PROMPT_PLACEHOLDER = "__BRAKTRAD_PROMPT__"
+
+
+@functools.lru_cache(maxsize=64)
+def _openrouter_body_template(model: str, response_format: str, stream: bool = False) -> Tuple[bytes, bytes]:
+    """Serialize a model's chat request once, split around the user prompt"""
+    request = {
+        "model": model,
+        "messages": [
+            _SYSTEM_MSG_OR,
+            {"role": "user", "content": _PROMPT_PLACEHOLDER}
+        ],
+        "temperature": 0.1,
+        "max_tokens": 5000,
+        "response_format": _RESPONSE_FORMATS[response_format]
+    }
+    if stream:
+        request["stream"] = True
+    body = orjson.dumps(request)
+    prefix, suffix = body.split(orjson.dumps(_PROMPT_PLACEHOLDER))
+    return prefix, suffix
+
+
+# Rationales longer than this are truncated during validation, which is
+# what lets a streamed prediction be cut once it is exceeded
+RATIONALE_MAX_CHARS = 275
+_DECISION_KEYS = ('"sentiment"', '"horizon"', '"confidence"')
+_RATIONALE_VALUE = re.compile(r'"rationale"\s*:\s*"')
+
+
+def _cut_streamed_prediction(content: str) -> Optional[str]:
+    """Close a partially streamed prediction once nothing useful is left to read.
+
+    Returns a complete JSON document when every decision field precedes the
+    rationale and the rationale already exceeds RATIONALE_MAX_CHARS, so the
+    validated result is identical to the one from the full response.
+    """
+    match = _RATIONALE_VALUE.search(content)
+    if not match:
+        return None
+    head = content[:match.start()]
+    if not all(key in head for key in _DECISION_KEYS):
+        return None
+    
+    # Walk the JSON string counting decoded characters
+    i, chars, n = match.end(), 0, len(content)
+    while i < n:
+        c = content[i]
+        if c == '"':
+            return None  # rationale finished, let the stream complete
+        if c == "\\":
+            if i + 1 >= n:
+                return None
+            if content[i + 1] == "u":
+                if i + 6 > n:
+                    return None
+                # A high surrogate decodes together with the escape after it
+                if "d800" <= content[i + 2:i + 6].lower() <= "dbff":
+                    chars -= 1
+                i += 6
+            else:
+                i += 2
+        else:
+            i += 1
+        chars += 1
+        if chars > RATIONALE_MAX_CHARS:
+            return content[:i] + '"}'
+    return None
+
+
+# OpenRouter clients shared by every analyzer in the process, keyed by API
+# key, so handlers reuse warm HTTP/2 connections instead of redialing TLS
+_openrouter_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _get_openrouter_client(api_key: str) -> httpx.AsyncClient:
+    """Return the pooled OpenRouter client for an API key, creating it once"""
+    client = _openrouter_clients.get(api_key)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url="https://openrouter.ai/api/v1",
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "HTTP-Referer": "https://braktrad.com",
+                "X-Title": "braktrad"
+            },
+            timeout=httpx.Timeout(connect=5.0, read=30.0, write=10.0, pool=5.0),
+            # Pool and HTTP/2 settings must live on an explicit transport;
+            # retries stay with tenacity on the call sites
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=0,
+                limits=httpx.Limits(
+                    max_connections=128,
+                    max_keepalive_connections=64,
+                    keepalive_expiry=60.0
+                )
+            )
+        )
+        _openrouter_clients[api_key] = client
+    return client
+
+
+# Responses at least this long are parsed off the event loop
+PARSE_OFFLOAD_CHARS = 1024
+_parse_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_parse_pool() -> ThreadPoolExecutor:
+    """Return the shared response-parsing pool, creating it once"""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sentiment-parse")
+    return _parse_pool
+
+
+async def close_shared_clients():
+    """Close pooled provider clients (called on application shutdown)"""
+    global _parse_pool
+    clients = list(_openrouter_clients.values())
+    _openrouter_clients.clear()
+    for client in clients:
+        await client.aclose()
+    
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False)
+        _parse_pool = None
+
+
+def _compile_template(template: str) -> Callable[[Dict[str, Any]], str]:
+    """Pre-parse a str.format template into a renderer with identical output.
+
+    Literal segments (with {{ }} escapes already resolved) are interleaved
+    with the context values fetched in one itemgetter call, so rendering
+    skips format's parser and the per-placeholder dict lookups.
+    """
+    literals: List[str] = []
+    fields: List[str] = []
+    pending = ""
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        pending += literal
+        if field is None:
+            continue
+        if not field.isidentifier() or spec or conversion:
+            raise ValueError(f"Unsupported template field: {field!r}")
+        literals.append(pending)
+        fields.append(field)
+        pending = ""
+    tail = pending
+    
+    if not fields:
+        return lambda context: tail
+    
+    # itemgetter returns a bare value rather than a tuple for one field
+    get = itemgetter(*fields)
+    fetch = (lambda context: (get(context),)) if len(fields) == 1 else get
+    
+    def render(context: Dict[str, Any]) -> str:
+        values = map(str, fetch(context))
+        return "".join(chain.from_iterable(zip(literals, values))) + tail
+    
+    return render
+
 
 class SentimentAnalyzer:
     """Orchestrates multi-model sentiment analysis"""
@@ -36,22 +341,7 @@ Context:
 - Is primary source: {is_primary_source}
 {market_context}
 
-DECISION FRAMEWORK:
-1. SURPRISE FACTOR (highest weight):
-   - Unexpected news > stronger reaction
-   - Confirms expectations > muted/no reaction
-   - Stale/priced-in (>30min old) > minimal edge
-
-2. MAGNITUDE SIGNALS:
-   Strong positive (+1): Beat by >10%, FDA approval, major contract win, activist/buyout premium
-   Strong negative (-1): Miss by >10%, guidance cut, SEC probe, data breach, unexpected exec departure, downgrade
-   Neutral (0): In-line results, minor updates, speculation, reiterations
-
-3. TIMING DECAY:
-   - <15 min: Maximum edge (confidence 0.7-1.0)
-   - 15-60 min: Declining edge (confidence 0.4-0.7)
-   - >60 min: Mostly priced in (confidence 0.1-0.4)
-   - Pre-market/after-hours: Predict next session open
+""" + _DECISION_FRAMEWORK + """
 
 Output JSON:
 {{
@@ -62,13 +352,44 @@ Output JSON:
 }}
 
 CRITICAL: Ignore long-term value. Predict only the immediate algorithmic and day-trader reaction."""
+    _render_prompt = staticmethod(_compile_template(SENTIMENT_PROMPT))
+    
+    # Several headlines per request: each numbered row is a compact JSON
+    # record, and predictions come back keyed by row number
+    BATCH_SENTIMENT_PROMPT = """You are a quantitative news trader optimizing for alpha capture. For EACH headline below, predict the MOST LIKELY directional price movement from its information edge.
+
+Headlines (one JSON record per numbered row; judge each row independently):
+{headline_rows}
+
+""" + _DECISION_FRAMEWORK + """
+
+Output JSON with exactly one prediction per row, using the row number as id:
+{{
+  "predictions": [
+    {{
+      "id": <row number>,
+      "sentiment": -1/0/1,
+      "horizon": "<1h"/"1-4h"/"same_day"/"next_open"/"24h",
+      "confidence": 0.0-1.0,
+      "rationale": "str <=275 chars"
+    }}
+  ]
+}}
+
+CRITICAL: Ignore long-term value. Predict only the immediate algorithmic and day-trader reaction."""
+    _render_batch_prompt = staticmethod(_compile_template(BATCH_SENTIMENT_PROMPT))
+    
+    _HORIZONS = HORIZONS
+    _HORIZON_IDX = {h: i for i, h in enumerate(_HORIZONS)}
+    _VALID_HORIZONS = frozenset(_HORIZONS)
     
     def __init__(self):
         """Initialize sentiment analyzer"""
         self.groq_client = None
         self.openrouter_client = None
         self.model_configs = self._load_model_configs()
-        self.rate_limiters = {}
+        # model -> (provider, model_id, rate limiter key)
+        self._model_info: Dict[str, Tuple[str, str, str]] = {}
     
     async def __aenter__(self):
         """Async context manager entry"""
@@ -76,32 +397,18 @@ CRITICAL: Ignore long-term value. Predict only the immediate algorithmic and day
             self.groq_client = AsyncGroq(api_key=settings.groq_api_key)
         
         if settings.openrouter_api_key:
-            self.openrouter_client = httpx.AsyncClient(
-                base_url="https://openrouter.ai/api/v1",
-                headers={
-                    "Authorization": f"Bearer {settings.openrouter_api_key}",
-                    "HTTP-Referer": "https://braktrad.com",
-                    "X-Title": "braktrad"
-                },
-                timeout=30.0
-            )
+            self.openrouter_client = _get_openrouter_client(settings.openrouter_api_key)
         
-        # Initialize rate limiters for each model
+        # Resolve configured models once instead of on every call
         for model in settings.selected_models:
-            provider = self._get_provider(model)
-            model_id = self._strip_provider_prefix(model)
-            key = f"{provider}:{model_id}"
-            self.rate_limiters[key] = RateLimiter(
-                rate_limit=settings.model_rate_limit,
-                window=settings.model_rate_window
-            )
+            self._get_model_info(model)
         
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Async context manager exit"""
-        if self.openrouter_client:
-            await self.openrouter_client.aclose()
+        # The OpenRouter client is shared and closed on application shutdown
+        self.openrouter_client = None
     
     async def analyze_headline(
         self,
@@ -109,30 +416,49 @@ CRITICAL: Ignore long-term value. Predict only the immediate algorithmic and day
         models: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """Analyze a headline with multiple models"""
+        result = await self._analyze_single(headline_data, models)
+        if result["aggregated"] is None:
+            raise ValueError("All models failed to analyze headline")
+        return result
+    
+    async def _analyze_single(
+        self,
+        headline_data: Dict[str, Any],
+        models: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Analyze one headline; ``aggregated`` is None if every model failed"""
         models = models or settings.selected_models
         
         if not models:
             raise ValueError("No models selected for analysis")
         
-        # Prepare context
+        # Prepare context and render the prompt once for every model
         context = self._prepare_context(headline_data)
+        prompt = self._render_prompt(context)
+        content_key = self._content_key(context)
         
         # Run all models in parallel
-        tasks = []
-        for model in models:
-            task = self._analyze_with_model(model, context)
-            tasks.append(task)
+        tasks = [
+            asyncio.create_task(self._analyze_with_model(model, prompt, content_key))
+            for model in models
+        ]
         
-        start_time = time.time()
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        total_time = time.time() - start_time
+        start_ns = time.perf_counter_ns()
+        if settings.quorum_enabled:
+            results = await self._gather_until_quorum(tasks, models)
+        else:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        total_time_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
         
         # Process results
         valid_results = []
         errors = []
+        skipped = []
         
         for model, result in zip(models, results):
-            if isinstance(result, Exception):
+            if result is None:
+                skipped.append(model)
+            elif isinstance(result, Exception):
                 logger.error(
                     "model_analysis_error",
                     model=model,
@@ -143,55 +469,312 @@ CRITICAL: Ignore long-term value. Predict only the immediate algorithmic and day
                 valid_results.append(result)
         
         # Aggregate results
-        if not valid_results:
-            raise ValueError("All models failed to analyze headline")
-        
-        aggregated = self._aggregate_sentiments(valid_results)
-        
-        logger.info(
-            "headline_analyzed",
-            ticker=headline_data.get("ticker"),
-            models_used=len(valid_results),
-            avg_sentiment=aggregated["avg_sentiment"],
-            total_time_ms=int(total_time * 1000)
-        )
+        aggregated = None
+        if valid_results:
+            aggregated = self._aggregate_sentiments(valid_results)
+            
+            logger.info(
+                "headline_analyzed",
+                ticker=headline_data.get("ticker"),
+                models_used=len(valid_results),
+                models_skipped=len(skipped),
+                avg_sentiment=aggregated["avg_sentiment"],
+                total_time_ms=total_time_ms
+            )
         
         return {
             "headline_id": headline_data.get("id"),
             "model_results": valid_results,
             "aggregated": aggregated,
             "errors": errors,
-            "analysis_time_ms": int(total_time * 1000)
+            "analysis_time_ms": total_time_ms
         }
     
+    async def _gather_until_quorum(
+        self,
+        tasks: List[asyncio.Task],
+        models: List[str]
+    ) -> List[Any]:
+        """Collect model results until the majority vote can no longer change
+        
+        Returns results in model order like ``gather(return_exceptions=True)``,
+        with None for models cancelled once quorum was reached.
+        """
+        outcomes: Dict[asyncio.Task, Any] = {}
+        pending = set(tasks)
+        
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    outcomes[task] = task.exception() or task.result()
+                
+                if pending and self._quorum_reached(
+                    [r for r in outcomes.values() if not isinstance(r, Exception)],
+                    len(models)
+                ):
+                    break
+        finally:
+            # Unlike gather, asyncio.wait leaves its tasks running when the
+            # caller is cancelled, so stop the stragglers either way
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        return [outcomes.get(task) for task in tasks]
+    
+    def _quorum_reached(self, results: List[Dict[str, Any]], num_models: int) -> bool:
+        """Check whether the models still running can no longer flip the vote
+        
+        With a net agreement of at least 60% of all models, even unanimous
+        dissent from the rest leaves the sign of the vote unchanged.
+        """
+        if len(results) < QUORUM_MIN_MODELS:
+            return False
+        
+        net_vote = abs(sum(r["sentiment"] for r in results))
+        if net_vote < math.ceil(num_models * QUORUM_AGREEMENT):
+            return False
+        
+        avg_confidence = sum(r["confidence"] for r in results) / len(results)
+        return avg_confidence >= settings.quorum_min_confidence
+    
+    async def analyze_headlines_batch(
+        self,
+        headlines: List[Dict[str, Any]],
+        models: Optional[List[str]] = None,
+        rows_per_prompt: int = DEFAULT_ROWS_PER_PROMPT
+    ) -> List[Dict[str, Any]]:
+        """Analyze many headlines, packing several into each model request
+        
+        Returns one result per headline, in input order, shaped like
+        ``analyze_headline``'s. Headlines that no model could score get
+        ``aggregated`` set to None instead of raising.
+        """
+        models = models or settings.selected_models
+        
+        if not models:
+            raise ValueError("No models selected for analysis")
+        
+        if not headlines:
+            return []
+        
+        # A single headline gains nothing from row packing
+        if len(headlines) == 1:
+            return [await self._analyze_single(headlines[0], models)]
+        
+        contexts = [self._prepare_context(h) for h in headlines]
+        content_keys = [self._content_key(c) for c in contexts]
+        rows_per_prompt = max(1, rows_per_prompt)
+        
+        model_results: List[List[Dict[str, Any]]] = [[] for _ in headlines]
+        errors: List[List[Dict[str, str]]] = [[] for _ in headlines]
+        
+        start_ns = time.perf_counter_ns()
+        
+        # Look up every (model, row) result at once
+        result_keys = []
+        for model in models:
+            provider, model_id, _ = self._get_model_info(model)
+            result_keys.extend(
+                self._result_key(provider, model_id, content_key)
+                for content_key in content_keys
+            )
+        cached_results = await self._get_cached_results(result_keys)
+        
+        # Only rows without a cached result go to each model, packed into
+        # one request per chunk; all requests are in flight together
+        calls = []
+        for m, model in enumerate(models):
+            pending = []
+            for i in range(len(headlines)):
+                cached = cached_results[m * len(headlines) + i]
+                if cached is not None:
+                    model_results[i].append(cached)
+                else:
+                    pending.append(i)
+            calls.extend(
+                (model, pending[start:start + rows_per_prompt])
+                for start in range(0, len(pending), rows_per_prompt)
+            )
+        
+        outcomes = await asyncio.gather(
+            *(
+                self._analyze_batch_with_model(
+                    model,
+                    [contexts[i] for i in chunk],
+                    [content_keys[i] for i in chunk]
+                )
+                for model, chunk in calls
+            ),
+            return_exceptions=True
+        )
+        analysis_time_ms = (time.perf_counter_ns() - start_ns) // 1_000_000
+        
+        for (model, chunk), outcome in zip(calls, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(
+                    "model_batch_analysis_error",
+                    model=model,
+                    rows=len(chunk),
+                    error=str(outcome)
+                )
+                for i in chunk:
+                    errors[i].append({"model": model, "error": str(outcome)})
+                continue
+            
+            for i, result in zip(chunk, outcome):
+                if result is None:
+                    errors[i].append({"model": model, "error": "No prediction returned for headline"})
+                else:
+                    model_results[i].append(result)
+        
+        aggregates = self._aggregate_batch(model_results)
+        results = []
+        for headline_data, valid_results, aggregated, headline_errors in zip(
+                headlines, model_results, aggregates, errors):
+            results.append({
+                "headline_id": headline_data.get("id"),
+                "model_results": valid_results,
+                "aggregated": aggregated,
+                "errors": headline_errors,
+                "analysis_time_ms": analysis_time_ms
+            })
+        
+        logger.info(
+            "headline_batch_analyzed",
+            headlines=len(headlines),
+            requests=len(calls),
+            failed=sum(1 for r in results if r["aggregated"] is None),
+            total_time_ms=analysis_time_ms
+        )
+        
+        return results
+    
+    async def _analyze_batch_with_model(
+        self,
+        model: str,
+        contexts: List[Dict[str, Any]],
+        content_keys: List[str]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Analyze several headlines with one request to a specific model
+        
+        Returns a result per context, None where the model skipped a row.
+        """
+        provider, model_id, rl_key = self._get_model_info(model)
+        
+        prompt = self._render_batch_prompt(
+            {"headline_rows": self._prepare_batch_rows(contexts)}
+        )
+        
+        # One request consumes one request slot regardless of row count
+        await self._acquire_rate_limit(rl_key, prompt)
+        
+        start_ns = time.perf_counter_ns()
+        
+        result = await self._call_provider(provider, model_id, prompt, "batch")
+        
+        response_time = (time.perf_counter_ns() - start_ns) // 1_000_000
+        
+        predictions = await self._parse_off_loop(self._parse_batch_response, result, len(contexts))
+        
+        model_results: List[Optional[Dict[str, Any]]] = []
+        for parsed, content_key in zip(predictions, content_keys):
+            if parsed is None:
+                model_results.append(None)
+                continue
+            model_result = {
+                "model_provider": provider,
+                "model_name": model_id,
+                "sentiment": parsed["sentiment"],
+                "confidence": parsed["confidence"],
+                "rationale": parsed["rationale"],
+                "horizon": parsed["horizon"],
+                "response_time_ms": response_time
+            }
+            await self._store_result(
+                self._result_key(provider, model_id, content_key), model_result
+            )
+            model_results.append(model_result)
+        
+        return model_results
+    
     async def _analyze_with_model(
         self,
         model: str,
-        context: Dict[str, Any]
+        prompt: str,
+        content_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Analyze with a specific model"""
-        provider = self._get_provider(model)
-        model_id = self._strip_provider_prefix(model)
+        provider, model_id, rl_key = self._get_model_info(model)
         
-        # Rate limiting (use consistent key with initialization)
-        rate_limiter_key = f"{provider}:{model_id}"
-        if rate_limiter_key in self.rate_limiters:
-            await self.rate_limiters[rate_limiter_key].acquire()
+        # Serve repeats from the result cache before spending rate budget
+        result_key = None
+        flight: Optional[asyncio.Future] = None
+        if content_key is not None:
+            result_key = self._result_key(provider, model_id, content_key)
+            cached = await self._get_cached_result(result_key)
+            if cached is not None:
+                return cached
+            
+            # Join an identical call already in flight, possibly from
+            # another analyzer, instead of submitting it again
+            while (inflight := _inflight.get(result_key)) is not None:
+                try:
+                    return dict(await asyncio.shield(inflight))
+                except asyncio.CancelledError:
+                    if not inflight.cancelled():
+                        raise
+                    # The leading call was cancelled (e.g. after quorum); lead a new one
+            
+            flight = asyncio.get_running_loop().create_future()
+            # Retrieve the outcome so a failure nobody joined is not reported twice
+            flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+            _inflight[result_key] = flight
         
-        start_time = time.time()
+        try:
+            model_result = await self._call_model(model, provider, model_id, rl_key, prompt)
+        except asyncio.CancelledError:
+            if flight is not None:
+                flight.cancel()
+            raise
+        except Exception as e:
+            if flight is not None:
+                flight.set_exception(e)
+            raise
+        else:
+            if flight is not None:
+                flight.set_result(model_result)
+        finally:
+            if flight is not None and _inflight.get(result_key) is flight:
+                del _inflight[result_key]
+        
+        if result_key is not None:
+            await self._store_result(result_key, model_result)
+        
+        return model_result
+    
+    async def _call_model(
+        self,
+        model: str,
+        provider: str,
+        model_id: str,
+        rl_key: str,
+        prompt: str
+    ) -> Dict[str, Any]:
+        """Rate-limit, call and parse one model for a rendered prompt"""
+        await self._acquire_rate_limit(rl_key, prompt)
+        
+        start_ns = time.perf_counter_ns()
         
         try:
-            if provider == "groq":
-                result = await self._call_groq(model_id, context)
-            elif provider == "openrouter":
-                result = await self._call_openrouter(model_id, context)
-            else:
-                raise ValueError(f"Unknown provider: {provider}")
+            result = await self._call_provider(provider, model_id, prompt)
             
-            response_time = int((time.time() - start_time) * 1000)
+            response_time = (time.perf_counter_ns() - start_ns) // 1_000_000
             
             # Validate and parse result
-            parsed = self._parse_model_response(result)
+            parsed = await self._parse_off_loop(self._parse_model_response, result)
             
             return {
                 "model_provider": provider,
@@ -213,40 +796,110 @@ CRITICAL: Ignore long-term value. Predict only the immediate algorithmic and day
             )
             raise
     
+    async def _acquire_rate_limit(self, key: str, prompt: str):
+        """Wait for the model's shared request (and token) budget"""
+        await _get_rate_limiter(
+            key, settings.model_rate_limit, settings.model_rate_window
+        ).acquire()
+        
+        if settings.model_token_rate_limit > 0:
+            await _get_rate_limiter(
+                f"{key}:tokens", settings.model_token_rate_limit, settings.model_rate_window
+            ).acquire(estimate_tokens(prompt))
+    
+    def _content_key(self, context: Dict[str, Any]) -> str:
+        """Identify a headline by what the models judge, not when it was seen"""
+        headline = " ".join(str(context["headline"]).lower().split())
+        return f"{context['ticker']}|{headline}|{context['market_session']}"
+    
+    def _result_key(self, provider: str, model_id: str, content_key: str) -> str:
+        """Hash a model and headline content into a result cache key"""
+        return hashlib.blake2b(
+            f"{provider}:{model_id}|{content_key}".encode(),
+            digest_size=16
+        ).hexdigest()
+    
+    async def _get_cached_result(self, result_key: str) -> Optional[Dict[str, Any]]:
+        """Look up a model result in process, then in Redis"""
+        cached = _result_cache.get(result_key)
+        if cached is not None:
+            return dict(cached)
+        
+        cache_manager = resolve_cache_manager()
+        if cache_manager:
+            cached = await cache_manager.get(RESULT_CACHE_PREFIX + result_key)
+            if cached is not None:
+                _result_cache.set(result_key, cached, settings.sentiment_cache_ttl)
+                return dict(cached)
+        
+        return None
+    
+    async def _get_cached_results(self, result_keys: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Look up many model results, fetching in-process misses in one MGET"""
+        results: List[Optional[Dict[str, Any]]] = []
+        misses: List[int] = []
+        for i, result_key in enumerate(result_keys):
+            cached = _result_cache.get(result_key)
+            results.append(dict(cached) if cached is not None else None)
+            if cached is None:
+                misses.append(i)
+        
+        cache_manager = resolve_cache_manager()
+        if cache_manager and misses:
+            values = await cache_manager.get_many(
+                [RESULT_CACHE_PREFIX + result_keys[i] for i in misses]
+            )
+            for i, cached in zip(misses, values):
+                if cached is not None:
+                    _result_cache.set(result_keys[i], cached, settings.sentiment_cache_ttl)
+                    results[i] = dict(cached)
+        
+        return results
+    
+    async def _store_result(self, result_key: str, model_result: Dict[str, Any]):
+        """Remember a model result in process and in Redis"""
+        _result_cache.set(result_key, model_result, settings.sentiment_cache_ttl)
+        
+        cache_manager = resolve_cache_manager()
+        if cache_manager:
+            await cache_manager.set(RESULT_CACHE_PREFIX + result_key, model_result, settings.sentiment_cache_ttl)
+    
+    async def _call_provider(
+        self,
+        provider: str,
+        model_id: str,
+        prompt: str,
+        response_format: str = "prediction"
+    ) -> str:
+        """Send a prompt to the model's provider and return the raw content
+        
+        ``response_format`` names the expected output shape ("prediction"
+        or "batch") for providers that enforce a JSON schema.
+        """
+        if provider == "groq":
+            return await self._call_groq(model_id, prompt)
+        if provider == "openrouter":
+            return await self._call_openrouter(model_id, prompt, response_format)
+        raise ValueError(f"Unknown provider: {provider}")
+    
     @retry(
         stop=stop_after_attempt(2),
         wait=wait_exponential(multiplier=1, min=1, max=5)
     )
-    async def _call_groq(self, model: str, context: Dict[str, Any]) -> str:
+    async def _call_groq(self, model: str, prompt: str) -> str:
         """Call Groq API"""
         if not self.groq_client:
             raise ValueError("Groq client not initialized")
         
-        prompt = self.SENTIMENT_PROMPT.format(**context)
-        
         response = await self.groq_client.chat.completions.create(
             model=model,
             messages=[
-                {"role": "system", "content": """You are a high-frequency news analytics engine trained on millions of headline-to-price reaction patterns. Your output ONLY a single valid JSON prediction of immediate market impact.
-Core capabilities:
-- Pattern match headlines to historical price reactions with 87% directional accuracy
-- Identify information surprise relative to market expectations
-- Assess algorithmic trading and retail sentiment triggers
-- Calibrate confidence based on signal clarity and timing
-
-Your edge: You process news faster than human traders and recognize patterns they miss.
-
-Strictly follow these rules:
-1. No extraneous text: Do not include introductory text or commentary before or after the JSON.
-2. No markdown: Do not wrap the JSON in markdown code blocks (e.g., ```json ... ```).
-3. Schema adherence: The JSON object must precisely match the structure and keys requested in the user's prompt.
-4. Error protocol: If you cannot fulfill the user's request, you must still output a JSON object. This object should contain a single key: `error`, with a string value explaining why the request could not be completed."""
-},
+                _SYSTEM_MSG_GROQ,
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1,
             max_tokens=5000,
-            response_format={"type": "json_object"}
+            response_format=_JSON_RESPONSE_FORMAT
         )
         
         return response.choices[0].message.content
@@ -255,46 +908,68 @@ Strictly follow these rules:
         stop=stop_after_attempt(2),
         wait=wait_exponential(multiplier=1, min=1, max=5)
     )
-    async def _call_openrouter(self, model: str, context: Dict[str, Any]) -> str:
+    async def _call_openrouter(self, model: str, prompt: str, response_format: str = "prediction") -> str:
         """Call OpenRouter API"""
         if not self.openrouter_client:
             raise ValueError("OpenRouter client not initialized")
         
-        prompt = self.SENTIMENT_PROMPT.format(**context)
+        if response_format == "prediction":
+            return await self._stream_openrouter(model, prompt)
         
+        # Splice the encoded prompt into the model's pre-serialized body
+        prefix, suffix = _openrouter_body_template(model, response_format)
         response = await self.openrouter_client.post(
             "/chat/completions",
-            json={
-                "model": model,
-                "messages": [
-                    {"role": "system", "content":"""You are a high-frequency news analytics engine trained on millions of headline-to-price reaction patterns. Your output ONLY a single valid JSON prediction of immediate market impact.
-
-Core capabilities:
-- Pattern match headlines to historical price reactions with 87% directional accuracy
-- Identify information surprise relative to market expectations
-- Assess algorithmic trading and retail sentiment triggers
-- Calibrate confidence based on signal clarity and timing
-
-Your edge: You process news faster than human traders and recognize patterns they miss.
-
-Strictly follow these rules:
-1. No extraneous text: Do not include introductory text or commentary before or after the JSON.
-2. No markdown: Do not wrap the JSON in markdown code blocks (e.g., ```json ... ```).
-3. Schema adherence: The JSON object must precisely match the structure and keys requested in the user's prompt.
-4. Error protocol: If you cannot fulfill the user's request, you must still output a JSON object. This object should contain a single key: `error`, with a string value explaining why the request could not be completed."""
-},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0.1,
-                "max_tokens": 5000,
-                "response_format": {"type": "json_object"}
-            }
+            content=prefix + orjson.dumps(prompt) + suffix,
+            headers={"Content-Type": "application/json"}
         )
         
         response.raise_for_status()
-        data = response.json()
         
-        return data["choices"][0]["message"]["content"]
+        # Decode the raw body directly rather than via response.json()
+        return orjson.loads(response.content)["choices"][0]["message"]["content"]
+    
+    async def _stream_openrouter(self, model: str, prompt: str) -> str:
+        """Stream a single prediction, hanging up once the rationale overflows"""
+        prefix, suffix = _openrouter_body_template(model, "prediction", True)
+        parts: List[str] = []
+        async with self.openrouter_client.stream(
+            "POST",
+            "/chat/completions",
+            content=prefix + orjson.dumps(prompt) + suffix,
+            headers={"Content-Type": "application/json"}
+        ) as response:
+            response.raise_for_status()
+            
+            async for line in response.aiter_lines():
+                # Skip keep-alive comments and blank event separators
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                
+                chunk = orjson.loads(data)
+                if "error" in chunk:
+                    raise ValueError(f"OpenRouter stream error: {chunk['error']}")
+                
+                # Usage-only and keep-alive chunks carry no choices
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                
+                delta = choices[0].get("delta", {}).get("content")
+                if not delta:
+                    continue
+                parts.append(delta)
+                
+                # Leaving the block closes the stream and stops generation
+                cut = _cut_streamed_prediction("".join(parts))
+                if cut is not None:
+                    logger.debug("openrouter_stream_cut", model=model, chars=len(cut))
+                    return cut
+        
+        return "".join(parts)
     
     def _prepare_context(self, headline_data: Dict[str, Any]) -> Dict[str, Any]:
         """Prepare context for model prompt"""
@@ -324,19 +999,65 @@ Market Context:
 - Day return: {market_data.get('return_1d', 'N/A')}%
 - Relative volume: {market_data.get('volume_rel', 'N/A')}x"""
             context["market_context"] = market_context
+            # Raw figures for the compact batch rows
+            context["market_data"] = market_data
         else:
             context["market_context"] = ""
         
         return context
     
+    def _prepare_batch_rows(self, contexts: List[Dict[str, Any]]) -> str:
+        """Render contexts as numbered rows of compact JSON records"""
+        rows = []
+        for row_id, context in enumerate(contexts, start=1):
+            record = {key: context[key] for key in _BATCH_ROW_FIELDS}
+            if context.get("market_data"):
+                record["market_data"] = context["market_data"]
+            rows.append(f"{row_id}. {orjson.dumps(record, default=str).decode()}")
+        return "\n".join(rows)
+    
+    async def _parse_off_loop(self, parse: Callable[..., Any], response: str, *args: Any) -> Any:
+        """Run a response parser, in the parse pool when the response is large
+        
+        Short responses parse faster inline than the thread hop costs.
+        """
+        if len(response) < PARSE_OFFLOAD_CHARS:
+            return parse(response, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_parse_pool(), parse, response, *args)
+    
+    def _parse_batch_response(self, response: str, num_rows: int) -> List[Optional[Dict[str, Any]]]:
+        """Parse a batch response into per-row predictions (None if missing/invalid)"""
+        try:
+            data = orjson.loads(response)
+        except orjson.JSONDecodeError as e:
+            logger.error("invalid_json_response", response=response, error=str(e))
+            raise ValueError(f"Invalid JSON response: {e}")
+        
+        predictions: List[Optional[Dict[str, Any]]] = [None] * num_rows
+        for item in data.get("predictions") or []:
+            row_id = item.get("id") if isinstance(item, dict) else None
+            if not isinstance(row_id, int) or not 1 <= row_id <= num_rows:
+                continue
+            try:
+                predictions[row_id - 1] = self._validate_prediction(item)
+            except ValueError as e:
+                logger.warning("invalid_batch_prediction", row=row_id, error=str(e))
+        
+        return predictions
+    
     def _parse_model_response(self, response: str) -> Dict[str, Any]:
         """Parse and validate model response"""
         try:
-            data = json.loads(response)
-        except json.JSONDecodeError as e:
+            data = orjson.loads(response)
+        except orjson.JSONDecodeError as e:
             logger.error("invalid_json_response", response=response, error=str(e))
             raise ValueError(f"Invalid JSON response: {e}")
         
+        return self._validate_prediction(data)
+    
+    def _validate_prediction(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate one prediction object and normalize its rationale"""
         # Validate sentiment
         sentiment = data.get("sentiment")
         if sentiment not in [-1, 0, 1]:
@@ -348,9 +1069,8 @@ Market Context:
             raise ValueError(f"Invalid confidence value: {confidence}")
         
         # Validate horizon
-        valid_horizons = ["<1h", "1-4h", "same_day", "next_open", "24h"]
         horizon = data.get("horizon", "same_day")
-        if horizon not in valid_horizons:
+        if horizon not in self._VALID_HORIZONS:
             raise ValueError(f"Invalid horizon value: {horizon}")
         
         # Validate rationale
@@ -359,8 +1079,8 @@ Market Context:
             rationale = str(rationale)
         
         # Truncate if too long
-        if len(rationale) > 275:
-            rationale = rationale[:272] + "..."
+        if len(rationale) > RATIONALE_MAX_CHARS:
+            rationale = rationale[:RATIONALE_MAX_CHARS - 3] + "..."
         
         return {
             "sentiment": sentiment,
@@ -374,17 +1094,23 @@ Market Context:
         if not results:
             return None
         
-        sentiments = [r["sentiment"] for r in results]
-        confidences = [r["confidence"] for r in results]
-        horizons = [r["horizon"] for r in results]
+        # One pass fills a (sentiment, confidence) matrix and a horizon tally.
+        # Column-major keeps each column contiguous, so the means sum in the
+        # same order (and round the same) as a 1-D mean would.
+        n = len(results)
+        values = np.empty((n, 2), dtype=np.float64, order="F")
+        horizon_counts = [0] * len(self._HORIZONS)
+        for i, r in enumerate(results):
+            values[i, 0] = r["sentiment"]
+            values[i, 1] = r["confidence"]
+            horizon_counts[self._HORIZON_IDX[r["horizon"]]] += 1
         
         # Calculate aggregates
-        avg_sentiment = np.mean(sentiments)
-        avg_confidence = np.mean(confidences)
-        dispersion = np.std(sentiments) if len(sentiments) > 1 else 0.0
+        avg_sentiment, avg_confidence = values.mean(axis=0)
+        dispersion = values[:, 0].std() if n > 1 else 0.0
         
         # Majority vote for sentiment
-        sentiment_sum = sum(sentiments)
+        sentiment_sum = values[:, 0].sum()
         if sentiment_sum > 0:
             majority_vote = 1
         elif sentiment_sum < 0:
@@ -392,12 +1118,25 @@ Market Context:
         else:
             majority_vote = 0
         
-        # Horizon vote - most common time horizon
-        from collections import Counter
-        horizon_counts = Counter(horizons)
-        horizon_vote = horizon_counts.most_common(1)[0][0] if horizon_counts else None
+        # Horizon vote - most common time horizon, ties going to the first seen
+        top_count = max(horizon_counts)
+        horizon_vote = next(
+            r["horizon"] for r in results
+            if horizon_counts[self._HORIZON_IDX[r["horizon"]]] == top_count
+        )
         
-        # Model votes breakdown
+        return {
+            "avg_sentiment": round(avg_sentiment, 3),
+            "avg_confidence": round(avg_confidence, 3),
+            "dispersion": round(dispersion, 3),
+            "majority_vote": majority_vote,
+            "horizon_vote": horizon_vote,
+            "num_models": len(results),
+            "model_votes": self._model_votes(results)
+        }
+    
+    def _model_votes(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Per-model vote breakdown stored with an aggregate"""
         model_votes = []
         for r in results:
             # r['model_name'] is normalized (without provider prefix). Compose explicit id once.
@@ -409,16 +1148,85 @@ Market Context:
                 "horizon": r["horizon"],
                 "rationale": r["rationale"]
             })
+        return model_votes
+    
+    def _aggregate_batch(
+        self,
+        batches: List[List[Dict[str, Any]]]
+    ) -> List[Optional[Dict[str, Any]]]:
+        """Aggregate the model results of many headlines in one vectorized pass
         
-        return {
-            "avg_sentiment": round(avg_sentiment, 3),
-            "avg_confidence": round(avg_confidence, 3),
-            "dispersion": round(dispersion, 3),
-            "majority_vote": majority_vote,
-            "horizon_vote": horizon_vote,
-            "num_models": len(results),
-            "model_votes": model_votes
-        }
+        Every result is packed once into flat sentiment/confidence/horizon
+        arrays; per-headline sums, deviations and horizon tallies are then
+        segmented reductions over those arrays. None marks headlines
+        without results.
+        """
+        # The segment setup only pays off across several headlines
+        if len(batches) <= 1:
+            return [self._aggregate_sentiments(results) for results in batches]
+        
+        counts = np.fromiter((len(b) for b in batches), dtype=np.int64, count=len(batches))
+        aggregates: List[Optional[Dict[str, Any]]] = [None] * len(batches)
+        total = int(counts.sum())
+        if not total:
+            return aggregates
+        
+        sentiments = np.empty(total, dtype=np.int8)
+        confidences = np.empty(total, dtype=np.float64)
+        horizons = np.empty(total, dtype=np.int8)
+        i = 0
+        for results in batches:
+            for r in results:
+                sentiments[i] = r["sentiment"]
+                confidences[i] = r["confidence"]
+                horizons[i] = self._HORIZON_IDX[r["horizon"]]
+                i += 1
+        
+        # Segment layout over the non-empty headlines
+        present = np.flatnonzero(counts)
+        n = counts[present]
+        starts = np.cumsum(counts)[present] - n
+        segment = np.repeat(np.arange(len(present)), n)
+        
+        # Sums run in element order within each segment. With many models
+        # np.mean sums pairwise instead, so the last bit (and very rarely the
+        # rounded third decimal) can differ from _aggregate_sentiments.
+        sentiment_values = sentiments.astype(np.float64)
+        sentiment_sum = np.add.reduceat(sentiment_values, starts)
+        avg_sentiment = sentiment_sum / n
+        avg_confidence = np.add.reduceat(confidences, starts) / n
+        deviation = sentiment_values - avg_sentiment[segment]
+        dispersion = np.sqrt(np.add.reduceat(deviation * deviation, starts) / n)
+        
+        # Horizon vote - most common time horizon, ties going to the first seen
+        tally = np.zeros((len(present), len(self._HORIZONS)), dtype=np.int64)
+        np.add.at(tally, (segment, horizons), 1)
+        is_top = tally[segment, horizons] == tally.max(axis=1)[segment]
+        first_top = np.minimum.reduceat(np.where(is_top, np.arange(total), total), starts)
+        
+        for k, h in enumerate(present):
+            results = batches[h]
+            aggregates[h] = {
+                "avg_sentiment": round(avg_sentiment[k], 3),
+                "avg_confidence": round(avg_confidence[k], 3),
+                "dispersion": round(dispersion[k], 3) if n[k] > 1 else 0.0,
+                "majority_vote": int(np.sign(sentiment_sum[k])),
+                "horizon_vote": self._HORIZONS[horizons[first_top[k]]],
+                "num_models": len(results),
+                "model_votes": self._model_votes(results)
+            }
+        
+        return aggregates
+    
+    def _get_model_info(self, model: str) -> Tuple[str, str, str]:
+        """Return (provider, model_id, rate limiter key) for a model"""
+        info = self._model_info.get(model)
+        if info is None:
+            # Models chosen per request may not be among the selected ones
+            provider = self._get_provider(model)
+            model_id = self._strip_provider_prefix(model)
+            info = self._model_info[model] = (provider, model_id, f"{provider}:{model_id}")
+        return info
     
     def _get_provider(self, model: str) -> str:
         """Determine provider for a model"""
@@ -478,37 +1286,54 @@ Market Context:
         }
 
 
-class RateLimiter:
-    """Rate limiter for API calls"""
+class TokenBucket:
+    """Token bucket rate limiter for API calls"""
     
     def __init__(self, rate_limit: int, window: int):
-        """Initialize rate limiter"""
-        self.rate_limit = rate_limit
+        """Initialize a full bucket refilling rate_limit tokens per window"""
+        self.capacity = rate_limit
         self.window = window  # seconds
-        self.calls = []
+        self.rate = rate_limit / window  # tokens per second
+        self.tokens = float(rate_limit)
+        self.last_refill = time.perf_counter()
         self.lock = asyncio.Lock()
     
-    async def acquire(self):
-        """Acquire permission to make a call"""
+    def _refill(self):
+        """Add the tokens accrued since the last refill"""
+        now = time.perf_counter()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+    
+    async def acquire(self, amount: float = 1):
+        """Wait until amount tokens are available, then take them"""
+        # An oversized request may drain a full bucket but never waits forever
+        amount = min(amount, self.capacity)
+        
+        # Waiters queue on the lock, so each sleeps only for its own deficit
+        # and tokens are handed out in arrival order
         async with self.lock:
-            now = time.time()
-            
-            # Remove old calls outside window
-            self.calls = [
-                call for call in self.calls
-                if now - call < self.window
-            ]
-            
-            # Check if we're at limit
-            if len(self.calls) >= self.rate_limit:
-                # Wait until oldest call expires
-                oldest = self.calls[0]
-                wait_time = self.window - (now - oldest)
-                if wait_time > 0:
-                    await asyncio.sleep(wait_time)
-                
-                # Retry
-                return await self.acquire()
-            
-            # Record this call
-            self.calls.append(now)
+            self._refill()
+            if self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+# Buckets shared by every analyzer in the process, by "provider:model" (and
+# "provider:model:tokens" for the token budget)
+_RATE_LIMITERS: Dict[str, TokenBucket] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def _get_rate_limiter(key: str, rate_limit: int, window: int) -> TokenBucket:
+    """Return the shared bucket for key, rebuilding it if the limits changed"""
+    with _RATE_LIMITERS_LOCK:
+        bucket = _RATE_LIMITERS.get(key)
+        if bucket is None or bucket.capacity != rate_limit or bucket.window != window:
+            bucket = _RATE_LIMITERS[key] = TokenBucket(rate_limit, window)
+        return bucket
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)"""
+    return len(text) // 4
@@ -0,0 +1,7 @@
+"""Shared pytest setup for the backend tests"""
+
+import sys
+from pathlib import Path
+
+# Modules import each other as top-level packages (``from services...``)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,95 @@
+"""Tests for cutting streamed OpenRouter predictions short"""
+
+import json
+
+import pytest
+
+from services.sentiment_analyzer import (
+    RATIONALE_MAX_CHARS,
+    SentimentAnalyzer,
+    _cut_streamed_prediction,
+)
+
+
+DECISION = {"sentiment": 1, "horizon": "same_day", "confidence": 0.8}
+
+
+@pytest.fixture
+def analyzer():
+    return SentimentAnalyzer()
+
+
+def _document(rationale, rationale_first=False, ensure_ascii=False):
+    """Serialize a prediction with the rationale last (or first)"""
+    if rationale_first:
+        data = {"rationale": rationale, **DECISION}
+    else:
+        data = {**DECISION, "rationale": rationale}
+    return json.dumps(data, ensure_ascii=ensure_ascii)
+
+
+def _first_cut(text):
+    """The cut the stream would take, feeding text one character at a time"""
+    for end in range(len(text) + 1):
+        cut = _cut_streamed_prediction(text[:end])
+        if cut is not None:
+            return cut
+    return None
+
+
+@pytest.mark.parametrize("rationale", [
+    "x" * (RATIONALE_MAX_CHARS + 1),
+    "x" * 2000,
+    'he said "beat" and \\ raised guidance ' * 20,
+    "line one\nline two\ttabbed " * 30,
+    "café → résumé " * 40,
+    "\U0001F680 rocket " * 60,
+    "\U0001F680" * (RATIONALE_MAX_CHARS + 1),
+], ids=["one-past-limit", "long", "escaped-quotes", "control-chars", "non-ascii",
+        "astral", "astral-one-past-limit"])
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_cut_matches_full_parse(analyzer, rationale, ensure_ascii):
+    text = _document(rationale, ensure_ascii=ensure_ascii)
+    cut = _first_cut(text)
+
+    assert cut is not None
+    assert analyzer._parse_model_response(cut) == analyzer._parse_model_response(text)
+
+
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_rationale_at_limit_is_not_cut(analyzer, ensure_ascii):
+    rationale = "\U0001F680" * RATIONALE_MAX_CHARS
+    text = _document(rationale, ensure_ascii=ensure_ascii)
+
+    assert _first_cut(text) is None
+    assert analyzer._parse_model_response(text)["rationale"] == rationale
+
+
+def test_cut_lands_on_first_char_past_limit(analyzer):
+    text = _document("a" * RATIONALE_MAX_CHARS + "b" * 100)
+    cut = _first_cut(text)
+
+    assert json.loads(cut)["rationale"] == "a" * RATIONALE_MAX_CHARS + "b"
+    parsed = analyzer._parse_model_response(cut)
+    assert parsed["rationale"] == "a" * (RATIONALE_MAX_CHARS - 3) + "..."
+
+
+def test_rationale_before_decision_fields_is_not_cut():
+    text = _document("x" * 2000, rationale_first=True)
+
+    assert _first_cut(text) is None
+
+
+def test_missing_decision_field_is_not_cut():
+    text = json.dumps({"sentiment": 1, "horizon": "24h", "rationale": "x" * 2000})
+
+    assert _first_cut(text) is None
+
+
+@pytest.mark.parametrize("partial", [
+    '{"sentiment": 1, "horizon": "24h", "confidence": 0.5, "rationale": "' + "x" * 100 + "\\",
+    '{"sentiment": 1, "horizon": "24h", "confidence": 0.5, "rationale": "' + "x" * 100 + "\\u00",
+    '{"sentiment": 1, "horizon": "24h", "confidence": 0.5, "ratio',
+])
+def test_incomplete_tail_waits_for_more(partial):
+    assert _cut_streamed_prediction(partial) is None